@@ -1,19 +1,60 @@
 import dash
 from dash import dcc, html
-from dash.dependencies import Input, Output, State, ALL
-from fig_map import create_map_figure
-from fig_price import create_price_figure
-from fig_crime import create_crime_figure
-from fig_potential import create_potential_figure
-from fig_room import create_room_figure
+from dash.dependencies import Input, Output, State, ALL, ClientsideFunction
+import dataset
+import figure_cache
+import metrics
+import static_figures
+from figure_patch import diff_figure
+from fig_map import map_image_url
+from fig_density import viewport_update
 from PIL import Image
 # from dotenv import load_dotenv
 import os
-import json
+import tempfile
+from collections import Counter
+from fig_room import create_room_figure, create_room_error_figure, ROOM_FIGURE_STEPS
+
+# 設為 1 時，房型圖改由 Dash background callback 在獨立行程中建立，不佔用請求執行緒
+# （使用 requirements.txt 中 dash[diskcache] 安裝的 diskcache；多個 gunicorn worker 共用同一個 diskcache 目錄）
+BACKGROUND_CALLBACKS = os.environ.get('BACKGROUND_CALLBACKS', '0') == '1'
+BACKGROUND_CACHE_DIR = os.environ.get(
+    'BACKGROUND_CACHE_DIR',
+    os.path.join(tempfile.gettempdir(), 'airbnb_dashboard_background')
+)
+
+background_callback_manager = None
+if BACKGROUND_CALLBACKS:
+    try:
+        import diskcache
+        background_callback_manager = dash.DiskcacheManager(diskcache.Cache(BACKGROUND_CACHE_DIR))
+    except ImportError as e:
+        print(f"Background callbacks disabled, diskcache is not installed: {e}")
+        BACKGROUND_CALLBACKS = False
 
-app = dash.Dash(__name__, assets_folder='assets')
+app = dash.Dash(__name__, assets_folder='assets', background_callback_manager=background_callback_manager)
 server = app.server
 
+# 靜態檔（地圖、圖片）讓瀏覽器長期快取，Flask 會自動附上 ETag / Last-Modified 供重新驗證
+server.config['SEND_FILE_MAX_AGE_DEFAULT'] = int(os.environ.get('ASSET_MAX_AGE', 7 * 24 * 3600))
+
+# /metrics：callback、SQL 查詢與圖表建立的延遲（Prometheus 格式）
+metrics.init_app(server, callback_names={
+    'selected-boroughs-store': 'update_selection',
+    'density-graph': 'update_viewport'
+})
+
+# 啟動時載入一次記憶體資料集，之後的點擊不再回到 SQLite 查詢
+if dataset.IN_MEMORY_DATASET:
+    dataset.get_dataset()
+
+# 地圖、觀光潛力與犯罪圖表不會改變，啟動時建立一次（可由磁碟快取讀取）
+static_figures.build_static_figures(map_image_url=map_image_url(app))
+
+# 選擇性地在 worker 啟動時預先建立全部 32 種行政區組合的圖表
+if os.environ.get('FIGURE_CACHE_WARMUP', '0') == '1':
+    figure_cache.warm_up()
+
 # 環境變數設置
 # dotenv_path = os.getenv("DOTENV_PATH")
 # load_dotenv(dotenv_path=dotenv_path)
@@ -60,517 +101,499 @@ BOROUGH_COLORS = {
     "Staten Island": "#fec3a6"
 }
 
-# 定義 borough_ranks 作為全局變量
-BOROUGH_RANKS = {
-    "Brooklyn": {"investment_rank": 5, "crime_rank": 1},
-    "Manhattan": {"investment_rank": 1, "crime_rank": 4},
-    "Queens": {"investment_rank": 2, "crime_rank": 3},
-    "Bronx": {"investment_rank": 4, "crime_rank": 2},
-    "Staten Island": {"investment_rank": 3, "crime_rank": 5}
-}
+def borough_panel_data(borough_data):
+    """提供給瀏覽器端 callback 的資料（由資料庫計算的排名、卡片顏色、圖片網址）"""
+    return {
+        name: {
+            'investment_rank': ranks['investment_rank'],
+            'crime_rank': ranks['crime_rank'],
+            'color': BOROUGH_COLORS[name],
+            'image': borough_images[name]
+        }
+        for name, ranks in borough_data.items()
+        if name in BOROUGH_COLORS
+    }
+
+
+def initial_figures():
+    """未選擇行政區時的價格圖、房型圖與街區圖，以及各圖表的狀態（建立失敗時為錯誤圖表與 'error'）"""
+    results = figure_cache.build_concurrently({
+        'price': (figure_cache.price_figure, figure_cache.FALLBACK_FIGURES['price']),
+        'room': (figure_cache.room_figure, figure_cache.FALLBACK_FIGURES['room']),
+        'neighborhood': (figure_cache.neighborhood_figure, figure_cache.FALLBACK_FIGURES['neighborhood']),
+    }, inline=True)
+    figures = {name: figure for name, (figure, _) in results.items()}
+    status = {name: 'ok' if ok else 'error' for name, (_, ok) in results.items()}
+    return figures, status
 
-app.layout = html.Div([
-    # 主容器
-    html.Div([
-        # 第一行：標題和總覽資訊
+
+def serve_layout():
+    """每次載入頁面時組出 layout：地圖數字與排名 store 取自同一份排名，資料庫更新後不需重啟"""
+    map_figure, borough_data = static_figures.get_ranking_figure('map')
+    figures, figure_status = initial_figures()
+    return html.Div([
+        # 主容器
         html.Div([
-            # 左側：標題和 logo
+            # 第一行：標題和總覽資訊
             html.Div([
-                html.Img(
-                    src=logo_path,
-                    style={"height": "40px"}
-                ),
-                html.Img(
-                    src=nyc_path,
-                    style={"height": "40px"}
-                ),
-                html.H1("Airbnb Investor’s Gold Rush: NYC", style={
-                    "color": "gray",
-                    "margin": "0",
-                    "fontSize": "24px"
-                })
+                # 左側：標題和 logo
+                html.Div([
+                    html.Img(
+                        src=logo_path,
+                        style={"height": "40px"}
+                    ),
+                    html.Img(
+                        src=nyc_path,
+                        style={"height": "40px"}
+                    ),
+                    html.H1("Airbnb Investor’s Gold Rush: NYC", style={
+                        "color": "gray",
+                        "margin": "0",
+                        "fontSize": "24px"
+                    })
+                ], style={
+                    "display": "flex",
+                    "alignItems": "center",
+                    "gap": "15px",
+                    "Width": "35%"
+                }),
+
+                # 總覽資訊
+                html.Div([
+                    html.Div([
+                        html.P([
+                            "Welcome, future host! ",
+                            html.Br(),
+                            "Click on one or more boroughs on the map to explore Airbnb business and investment insights.",
+                            html.Br(),
+                            "Hover over the map or charts for detailed insights.Compare boroughs side by side and make confident, data-driven investment decisions!"
+
+                        ],style={
+                                "fontSize": "19px",
+                                "color": "gray",
+                                "lineHeight":"1.3",
+                                "margin": "0"
+                            })
+                     ], style={
+                                "flex": "1",
+                                "backgroundColor":"white",
+                                "padding": "15px",
+                                "borderRadius":"8px",
+                                "boxShadow": "0 2px 6px rgba(0,0,0,0.1)",
+                                "marginLeft":"100px",
+                                "width":"87%"
+                            })
+                ])
             ], style={
                 "display": "flex",
-                "alignItems": "center",
-                "gap": "15px",
-                "Width": "35%"
+                "marginBottom": "20px"
             }),
 
-            # 總覽資訊
+            # 第二行：地圖、選擇區域和詳細資訊
             html.Div([
+                # 左側：地圖
                 html.Div([
-                    html.P([
-                        "Welcome, future host! ",
-                        html.Br(),
-                        "Click on one or more boroughs on the map to explore Airbnb business and investment insights.",
-                        html.Br(),
-                        "Hover over the map or charts for detailed insights.Compare boroughs side by side and make confident, data-driven investment decisions!"
-
-                    ],style={
-                            "fontSize": "19px",
-                            "color": "gray",
-                            "lineHeight":"1.3",
-                            "margin": "0"
-                        })
-                 ], style={
-                            "flex": "1",
-                            "backgroundColor":"white",
-                            "padding": "15px",
-                            "borderRadius":"8px",
-                            "boxShadow": "0 2px 6px rgba(0,0,0,0.1)",
-                            "marginLeft":"100px",
-                            "width":"87%"
-                        })
-            ])
-        ], style={
-            "display": "flex",
-            "marginBottom": "20px"
-        }),
-
-        # 第二行：地圖、選擇區域和詳細資訊
-        html.Div([
-            # 左側：地圖
-            html.Div([
-                html.H3("Click Dots to see Borough details", style={
-                    "color": "darkred",
-                    "textAlign": "center",
-                    "marginBottom": "10px",
-                    "fontSize": "23px"
+                    html.H3("Click Dots to see Borough details", style={
+                        "color": "darkred",
+                        "textAlign": "center",
+                        "marginBottom": "10px",
+                        "fontSize": "23px"
+                    }),
+                    dcc.Graph(
+                        id='nyc-map',
+                        figure=map_figure,
+                        config={"displayModeBar": False},
+                        style={
+                            "height": "400px",
+                            "width": "100%"
+                        }
+                    )
+                ], style={
+                    "backgroundColor": "white",
+                    "padding": "15px",
+                    "borderRadius": "10px",
+                    "boxShadow": "0 2px 10px rgba(0,0,0,0.1)",
+                    "width": "32%"
                 }),
-                dcc.Graph(
-                    id='nyc-map',
-                    figure=create_map_figure(),
-                    config={"displayModeBar": False},
-                    style={
+
+                # 中間：選擇的區域列表
+                html.Div([
+                    html.H3("Selected Boroughs", style={
+                        "color": "gray",
+                        "textAlign": "center",
+                        "marginBottom": "10px",
+                        "fontSize": "18px"
+                    }),
+                    html.Div(id="selected-boroughs", style={
+                        "backgroundColor": "white",
+                        "padding": "10px",
+                        "boxShadow": "0 2px 10px rgba(0,0,0,0.1)",
+                        "borderRadius": "10px",
                         "height": "400px",
-                        "width": "100%"
-                    }
-                )
+                        "overflowY": "auto",
+                        "fixe": 1
+                    }),
+                    html.Button("Clear All", id="clear-selection-button", style={
+                        "marginTop": "10px",
+                        "width": "100%",
+                        "padding": "6px",
+                        "border": "none",
+                        "borderRadius": "8px",
+                        "backgroundColor": "#eeeeee",
+                        "color": "#666",
+                        "cursor": "pointer"
+                    }),
+                    dcc.Store(id='selected-boroughs-store', data=[]),
+                    dcc.Store(id='figure-status-store', data=figure_status),
+                    dcc.Store(id='borough-ranks-store', data=borough_panel_data(borough_data))
+                ], style={
+                    "backgroundColor": "white",
+                    "padding": "20px",
+                    "borderRadius": "10px",
+                    "minWidth":"300px",
+                    "marginLeft": "2%"
+                }),
+
+                # 右側：詳細資訊
+                html.Div(id="borough-details", style={
+                    "backgroundColor": "white",
+                    "padding": "20px",
+                    "borderRadius": "12px",
+                    "boxShadow": "0 4px 12px rgba(0,0,0,0.1)",
+                    "flex": "1",
+                    "marginLeft": "2%",
+                    "width":"39%",
+                    "minWidth":"500px",
+
+                })
             ], style={
-                "backgroundColor": "white",
-                "padding": "15px",
-                "borderRadius": "10px",
-                "boxShadow": "0 2px 10px rgba(0,0,0,0.1)",
-                "width": "32%"
+                "display": "flex",
+                "marginBottom": "20px"
             }),
 
-            # 中間：選擇的區域列表
+            # 第三行：Potential和Crime圖表
             html.Div([
-                html.H3("Selected Boroughs", style={
-                    "color": "gray",
-                    "textAlign": "center",
-                    "marginBottom": "10px",
-                    "fontSize": "18px"
-                }),
-                html.Div(id="selected-boroughs", style={
+                html.Div([
+                    dcc.Graph(
+                        figure=static_figures.get_static_figure('potential'),
+                        config={"displayModeBar": False},
+                        style={"height": "450px"}
+                    )
+                ], style={
+                    "flex": "1",
                     "backgroundColor": "white",
-                    "padding": "10px",
-                    "boxShadow": "0 2px 10px rgba(0,0,0,0.1)",
+                    "padding": "15px",
                     "borderRadius": "10px",
-                    "height": "400px",
-                    "overflowY": "auto",
-                    "fixe": 1
+                    "boxShadow": "0 2px 10px rgba(0,0,0,0.1)"
                 }),
-                dcc.Store(id='selected-boroughs-store', data=[])
+                html.Div([
+                    dcc.Graph(
+                        figure=static_figures.get_static_figure('crime'),
+                        config={"displayModeBar": False},
+                        style={"height": "450px"}
+                    )
+                ], style={
+                    "flex": "1",
+                    "backgroundColor": "white",
+                    "padding": "15px",
+                    "borderRadius": "10px",
+                    "boxShadow": "0 2px 10px rgba(0,0,0,0.1)",
+                    "marginLeft": "20px"
+                })
             ], style={
-                "backgroundColor": "white",
-                "padding": "20px",
-                "borderRadius": "10px",
-                "minWidth":"300px",
-                "marginLeft": "2%"
+                "display": "flex",
+                "marginBottom": "20px"
             }),
 
-            # 右側：詳細資訊
-            html.Div(id="borough-details", style={
-                "backgroundColor": "white",
-                "padding": "20px",
-                "borderRadius": "12px",
-                "boxShadow": "0 4px 12px rgba(0,0,0,0.1)",
-                "flex": "1",
-                "marginLeft": "2%",
-                "width":"39%",
-                "minWidth":"500px",
-
-            })
-        ], style={
-            "display": "flex",
-            "marginBottom": "20px"
-        }),
-
-        # 第三行：Potential和Crime圖表
-        html.Div([
+            # 第四行：Price和Room Type圖表
             html.Div([
-                dcc.Graph(
-                    figure=create_potential_figure(),
-                    config={"displayModeBar": False},
-                    style={"height": "450px"}
-                )
+                html.Div([
+                    dcc.Graph(
+                        id='price-graph',
+                        figure=figures['price'],
+                        config={"displayModeBar": False},
+                        style={"height": "450px"}
+                    )
+                ], style={
+                    "flex": "1",
+                    "backgroundColor": "white",
+                    "padding": "15px",
+                    "borderRadius": "10px",
+                    "boxShadow": "0 2px 10px rgba(0,0,0,0.1)"
+                }),
+                html.Div([
+                    # background callback 建立房型圖時顯示的進度條
+                    html.Progress(
+                        id='room-progress',
+                        value='0',
+                        max=str(ROOM_FIGURE_STEPS),
+                        style={"display": "none"}
+                    ),
+                    dcc.Graph(
+                        id='room-graph',
+                        figure=figures['room'],
+                        config={"displayModeBar": False},
+                        style={"height": "450px"}
+                    )
+                ], style={
+                    "flex": "1",
+                    "backgroundColor": "white",
+                    "padding": "15px",
+                    "borderRadius": "10px",
+                    "boxShadow": "0 2px 10px rgba(0,0,0,0.1)",
+                    "marginLeft": "20px"
+                })
             ], style={
-                "flex": "1",
-                "backgroundColor": "white",
-                "padding": "15px",
-                "borderRadius": "10px",
-                "boxShadow": "0 2px 10px rgba(0,0,0,0.1)"
+                "display": "flex",
+                "marginBottom": "20px"
             }),
+
+            # 第五行：最後點選的行政區展開為各街區
             html.Div([
                 dcc.Graph(
-                    figure=create_crime_figure(),
-                    config={"displayModeBar": False},
-                    style={"height": "450px"}
+                    id='neighborhood-graph',
+                    figure=figures['neighborhood'],
+                    config={"displayModeBar": False}
                 )
             ], style={
-                "flex": "1",
                 "backgroundColor": "white",
                 "padding": "15px",
                 "borderRadius": "10px",
                 "boxShadow": "0 2px 10px rgba(0,0,0,0.1)",
-                "marginLeft": "20px"
-            })
-        ], style={
-            "display": "flex",
-            "marginBottom": "20px"
-        }),
+                "marginBottom": "20px"
+            }),
 
-        # 第四行：Price和Room Type圖表
-        html.Div([
+            # 第六行：房源密度網格圖
             html.Div([
                 dcc.Graph(
-                    id='price-graph',
-                    figure=create_price_figure(),
+                    id='density-graph',
+                    figure=static_figures.get_static_figure('density'),
                     config={"displayModeBar": False},
-                    style={"height": "450px"}
-                )
+                    style={"height": "500px"}
+                ),
+                # 縮放範圍與繪圖區像素大小（由瀏覽器端 callback 寫入）
+                dcc.Store(id='density-viewport-store')
             ], style={
-                "flex": "1",
                 "backgroundColor": "white",
                 "padding": "15px",
                 "borderRadius": "10px",
                 "boxShadow": "0 2px 10px rgba(0,0,0,0.1)"
-            }),
-            html.Div([
-                dcc.Graph(
-                    id='room-graph',
-                    figure=create_room_figure(),
-                    config={"displayModeBar": False},
-                    style={"height": "450px"}
-                )
-            ], style={
-                "flex": "1",
-                "backgroundColor": "white",
-                "padding": "15px",
-                "borderRadius": "10px",
-                "boxShadow": "0 2px 10px rgba(0,0,0,0.1)",
-                "marginLeft": "20px"
             })
         ], style={
-            "display": "flex"
+            "maxWidth": "1800px",
+            "margin": "0 auto",
+            "padding": "20px"
         })
     ], style={
-        "maxWidth": "1800px",
-        "margin": "0 auto",
+        "backgroundColor": "#f5f5f5",
+        "minHeight": "100vh",
         "padding": "20px"
     })
-], style={
-    "backgroundColor": "#f5f5f5",
-    "minHeight": "100vh",
-    "padding": "20px"
-})
 
-def generate_borough_cards(boroughs):
-    if not boroughs:
-        return html.Div("Click on boroughs to see details",
-                       style={"textAlign": "center", "color": "#666"})
 
-    # 根據 investment_rank 排序
-    sorted_boroughs = sorted(boroughs, key=lambda x: x['investment_rank'])
+app.layout = serve_layout
 
-    return html.Div([
-        html.Div([
-            html.Div([
-                html.Button(
-                    "×",
-                    id={'type': 'close-button', 'index': b['name']},
-                    style={
-                        'position': 'absolute',
-                        'right': '8px',
-                        'top': '50%',
-                        'background': 'none',
-                        'border': 'none',
-                        'fontSize': '14px',
-                        'cursor': 'pointer',
-                        'color': '#666',
-                        'padding':'4px'
-                    }
-                ),
-                html.H4(b['name'], style={
-                    'margin': '0 0 10px 0',
-                    'color': '#333',
-                    'fontSize': '20px'
-                }),
-                html.P([
-                    "Investment Rank: ",
-                    html.Strong(f"{b['investment_rank']}")
-                ], style={
-                    'margin': '0',
-                    'fontSize': '14px',
-                    'color': '#FF4500',
-                    'fontWeight': 'bold'
-                })
-            ], style={
-                'position': 'relative',
-                'padding': '10px',
-                'marginBottom': '10px',
-                'borderRadius': '8px',
-                'backgroundColor': BOROUGH_COLORS[b['name']],
-                'boxShadow': '0 1px 3px rgba(0,0,0,0.1)',
-                'height':'45px',
-                'width': '92%'
-            })
-        ]) for b in sorted_boroughs
-    ], style={
-        'display': 'flex',
-        'flexDirection': 'column',
-        'gap': '3px'
-    })
+# 每個使用者動作觸發的 callback 與圖表管線次數（用於確認沒有重複計算）
+CALLBACK_COUNTS = Counter()
 
-def update_borough_details(selected_borough):
-    if not selected_borough:
-        return html.Div("Select a borough to see details",
-                       style={"textAlign": "center", "color": "gray"})
 
-    return html.Div([
-        html.H3("Best Investment Borough",
-            style={"fontSize": "28px","textAlign": "left", "color": "#333", "marginBottom": "20px"}),
-        html.Div([
-            html.P([
-                "Total Listings: ",
-                html.Strong(f"{selected_borough['listings']:,}")
-            ], style={"marginBottom": "10px"}),
-            html.P([
-                "Tourism Value: ",
-                html.Strong(f"${selected_borough['tourism']:,}M")
-            ], style={"marginBottom": "10px"}),
-            html.P([
-                "Crime Rank: ",
-                html.Strong(f"{selected_borough['crime_rank']}")
-            ], style={"marginBottom": "10px"}),
-        ], style={"fontSize": "20px"}),  # 加上逗號
-        html.Div([
-            html.Img(
-                src=borough_images[selected_borough['name']],
-                style={
-                    "width": "100%",
-                    "height": "100%",
-                    "objectFit": "cover",
-                    "borderRadius": "8px",
-                    "maxHeight": "350px"
-                }
-            )
-        ], style={"width": "65%", "overflow": "hidden"})
-    ])
+def reduce_selection(state, action):
+    """行政區選擇的狀態轉換
+
+    action 為 {'type': 'add' | 'remove' | 'clear', 'borough': ...}，
+    add 需要完整的行政區資料，remove 只需要名稱。回傳新的選擇列表。
+    """
+    state = state or []
+    if action['type'] == 'add':
+        if any(b['name'] == action['borough']['name'] for b in state):
+            return state
+        return state + [action['borough']]
+    if action['type'] == 'remove':
+        return [b for b in state if b['name'] != action['borough']]
+    if action['type'] == 'clear':
+        return []
+    raise ValueError(f"Unknown selection action: {action['type']}")
+
+
+def action_from_trigger(triggered_id, clickData, current_selections):
+    """把觸發 callback 的元件轉成 reducer 的 action"""
+    if triggered_id == 'clear-selection-button':
+        return {'type': 'clear'}
+
+    if triggered_id == 'nyc-map':
+        # 數字與排名都取自使用者看到的地圖，與頁面上的其他資料一致
+        clicked_borough, listings_count, tourism_value, crime_rank, investment_rank = \
+            clickData['points'][0]['customdata'][:5]
+        # 地圖上再點一次已選擇的行政區即取消選擇
+        if any(b['name'] == clicked_borough for b in current_selections or []):
+            return {'type': 'remove', 'borough': clicked_borough}
+        return {'type': 'add', 'borough': {
+            'name': clicked_borough,
+            'listings': listings_count,
+            'tourism': tourism_value,
+            'crime_rank': crime_rank,
+            'investment_rank': investment_rank
+        }}
+
+    # 卡片上的關閉按鈕
+    return {'type': 'remove', 'borough': triggered_id['index']}
+
+
+# 由 update_selection 更新的圖表；啟用 background callback 時房型圖改由 update_room_figure 產生
+SELECTION_CHARTS = ('price', 'neighborhood') if BACKGROUND_CALLBACKS else ('price', 'room', 'neighborhood')
+
+
+def drilldown_borough(boroughs):
+    """街區圖展開的行政區：最後點選的行政區（未選擇時為 None）"""
+    return boroughs[-1] if boroughs else None
+
+
+# 各圖表由行政區選擇（依點選順序）取得快取版 figure 與快取 key
+SELECTION_FIGURES = {
+    'price': figure_cache.price_figure,
+    'room': figure_cache.room_figure,
+    'neighborhood': lambda boroughs: figure_cache.neighborhood_figure(drilldown_borough(boroughs)),
+}
+
+SELECTION_KEYS = {
+    'price': figure_cache.price_key,
+    'room': figure_cache.room_key,
+    'neighborhood': lambda boroughs: figure_cache.neighborhood_key(drilldown_borough(boroughs)),
+}
+
+
+def render_selection(previous_boroughs, selected_boroughs, previous_status=None, charts=SELECTION_CHARTS):
+    """唯一的圖表管線：在執行緒池中同時建立 charts 中的圖表
+
+    回傳 ({圖表: 更新}, 狀態)。更新為相對於目前畫面的差異（dash.Patch）；
+    上一次顯示的是錯誤圖表時則送出完整 figure。逾時或失敗時改送各模組的錯誤圖表。
+    """
+    CALLBACK_COUNTS['render_selection'] += 1
+    previous_status = previous_status or {}
+
+    def figure_update(name):
+        build = SELECTION_FIGURES[name]
+        figure = build(selected_boroughs)
+        if previous_status.get(name) == 'error':
+            return figure
+        return diff_figure(build(previous_boroughs), figure)
+
+    # 這次要更新的圖表都已快取時不必交給執行緒池
+    cached = all(
+        SELECTION_KEYS[name](boroughs) in figure_cache.cache
+        for name in charts
+        for boroughs in (previous_boroughs, selected_boroughs)
+    )
+    results = figure_cache.build_concurrently({
+        name: (lambda name=name: figure_update(name), figure_cache.FALLBACK_FIGURES[name])
+        for name in charts
+    }, inline=cached)
+    updates = {name: result for name, (result, _) in results.items()}
+    status = {name: 'ok' if ok else 'error' for name, (_, ok) in results.items()}
+    return updates, status
+
+# 選擇卡片與最佳投資面板只依賴 store 與排名資料，在瀏覽器端產生（見 assets/dashboard.js）
+app.clientside_callback(
+    ClientsideFunction(namespace='boroughs', function_name='render_cards'),
+    Output('selected-boroughs', 'children'),
+    Input('selected-boroughs-store', 'data'),
+    State('borough-ranks-store', 'data')
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace='boroughs', function_name='render_details'),
+    Output('borough-details', 'children'),
+    Input('selected-boroughs-store', 'data'),
+    State('borough-ranks-store', 'data')
+)
 
 @app.callback(
-    [Output('selected-boroughs-store', 'data'),
-     Output('selected-boroughs', 'children'),
-     Output('price-graph', 'figure'),
-     Output('room-graph', 'figure'),
-     Output('borough-details', 'children')],
-    [Input('nyc-map', 'clickData')],
-    [State('selected-boroughs-store', 'data')]
+    [Output('selected-boroughs-store', 'data')]
+    + [Output(f'{name}-graph', 'figure') for name in SELECTION_CHARTS]
+    + [Output('figure-status-store', 'data')],
+    [Input('nyc-map', 'clickData'),
+     Input({'type': 'close-button', 'index': ALL}, 'n_clicks'),
+     Input('clear-selection-button', 'n_clicks')],
+    [State('selected-boroughs-store', 'data'),
+     State('figure-status-store', 'data')],
+    prevent_initial_call=True
 )
-def update_selected_boroughs(clickData, current_selections):
-    best_investment = "Manhattan"
-    details_content = html.Div("Select a borough to see details",
-                             style={"textAlign": "center", "color": "gray"})
-
-    borough_image_path = "image"
-
-
-    if clickData is None:
-        return (
-            current_selections,
-            generate_borough_cards(current_selections),
-            create_price_figure(),
-            create_room_figure(),
-            update_borough_details(None)
-        )
-
-    clicked_borough = clickData['points'][0]['customdata'][0]
-    listings_count = clickData['points'][0]['customdata'][1]
-    tourism_value = clickData['points'][0]['customdata'][2]
-
-    investment_rank = BOROUGH_RANKS[clicked_borough]["investment_rank"]
-    crime_rank = BOROUGH_RANKS[clicked_borough]["crime_rank"]
-
-    borough_data = {
-        'name': clicked_borough,
-        'listings': listings_count,
-        'tourism': tourism_value,
-        'crime_rank': crime_rank,
-        'investment_rank': investment_rank
-    }
+@metrics.timed(metrics.CALLBACK_SECONDS, 'update_selection')
+def update_selection(clickData, close_clicks, clear_clicks, current_selections, figure_status):
+    """地圖點擊、卡片關閉與清除全部都經由同一個 reducer 更新選擇
 
-    if current_selections is None:
-        current_selections = []
+    價格圖、房型圖與最後點選行政區的街區圖（讀取預先彙總的街區資料表）在同一次回應中更新，
+    每次點擊只有一個伺服器往返。
+    """
+    CALLBACK_COUNTS['update_selection'] += 1
 
-    if any(b['name'] == clicked_borough for b in current_selections):
-        current_selections = [b for b in current_selections if b['name'] != clicked_borough]
-    else:
-        current_selections.append(borough_data)
+    ctx = dash.callback_context
+    # 新產生的卡片也會觸發 callback，沒有實際點擊時不更新
+    if not ctx.triggered or not ctx.triggered[0]['value']:
+        raise dash.exceptions.PreventUpdate
 
-    if current_selections:
-        selected_ranks = {b['name']: b['investment_rank'] for b in current_selections}
-        best_investment = min(selected_ranks.items(), key=lambda x: x[1])[0]
+    action = action_from_trigger(ctx.triggered_id, clickData, current_selections)
+    updated_selections = reduce_selection(current_selections, action)
 
-        top_borough = next(b for b in current_selections if b['name'] == best_investment)
-        details_content = html.Div([
-            html.H3("Best Investment Borough",
-                   style={"textAlign": "center", "color": "darkred","fontSize":"23px","marginTop": "5px"}),
-            html.Div([
-                html.Div([
-                    html.Div([
-                        html.H4(f"{top_borough['name']}",
-                            style={"color": "#333", "marginTop": "10px","fontSize":"20px"}),
-                        html.P([
-                            "Total Listings: ",
-                            html.Strong(f"{top_borough['listings']:,}")
-                        ], style={"marginBottom": "12px", "fontSize": "16px"}),
-                        html.P([
-                            "Tourism Value: ",
-                            html.Strong(f"${top_borough['tourism']:,}M")
-                        ], style={"marginBottom": "12px", "fontSize": "16px"}),
-                        html.P([
-                            "Crime Rank: ",
-                            html.Strong(f"{top_borough['crime_rank']}")
-                        ], style={"marginBottom": "12px", "fontSize": "16px"}),
-                        html.P([
-                            "Investment Rank: ",
-                            html.Strong(f"{top_borough['investment_rank']}")
-                        ], style={"marginBottom": "12px", "fontSize": "16px"})
-                    ])
-                ], style={"width": "30%"}),
+    previous_names = [b['name'] for b in current_selections or []]
+    selected_names = [b['name'] for b in updated_selections]
+    if previous_names == selected_names:
+        raise dash.exceptions.PreventUpdate
 
-                html.Div([
-                    html.Img(
-                        src=borough_images[top_borough['name']],
-                        style={
-                            "width": "100%",
-                            "height": "300px",
-                            "objectFit": "cover",
-                            "borderRadius": "8px",
-                            "maxHeight": "350px",
-                            "display": "block"
-                        }
-                    )
-                ], style={"width": "65%","overflow": "hidden"})
-            ], style={
-                "display": "flex",
-                "alignItems": "flex-start",
-                "justifyContent": "space-between"
-            })
-        ], style={
-            "backgroundColor": "white",
-            "borderRadius": "10px",
-            "padding": "20px"
-        })
+    updates, status = render_selection(previous_names, selected_names, figure_status)
+    return [updated_selections] + [updates[name] for name in SELECTION_CHARTS] + [status]
 
-    return (
-        current_selections,
-        generate_borough_cards(current_selections),
-        create_price_figure([b['name'] for b in current_selections]),
-        create_room_figure([b['name'] for b in current_selections]),
-        details_content
-    )
+
+app.clientside_callback(
+    ClientsideFunction(namespace='density', function_name='viewport'),
+    Output('density-viewport-store', 'data'),
+    Input('density-graph', 'relayoutData'),
+    prevent_initial_call=True
+)
 
 @app.callback(
-    [Output('selected-boroughs-store', 'data', allow_duplicate=True),
-     Output('selected-boroughs', 'children', allow_duplicate=True),
-     Output('price-graph', 'figure', allow_duplicate=True),
-     Output('room-graph', 'figure', allow_duplicate=True),
-     Output('borough-details', 'children', allow_duplicate=True)],
-    [Input({'type': 'close-button', 'index': ALL}, 'n_clicks')],
-    [State('selected-boroughs-store', 'data')],
+    Output('density-graph', 'figure'),
+    Input('density-viewport-store', 'data'),
     prevent_initial_call=True
 )
-def remove_borough_card(n_clicks, current_selections):
-   if not any(n_clicks):
-       raise dash.exceptions.PreventUpdate
-
-   ctx = dash.callback_context
-   if not ctx.triggered:
-       raise dash.exceptions.PreventUpdate
-
-   button_id = json.loads(ctx.triggered[0]['prop_id'].split('.')[0])
-   borough_to_remove = button_id['index']
-
-   updated_selections = [b for b in current_selections if b['name'] != borough_to_remove]
-   selected_borough_names = [b['name'] for b in updated_selections]
-
-   best_investment = "Manhattan"
-   details_content = html.Div("Select a borough to see details",
-                            style={"textAlign": "center", "color": "gray"})
-
-   if updated_selections:
-       selected_ranks = {b['name']: b['investment_rank'] for b in updated_selections}
-       best_investment = min(selected_ranks.items(), key=lambda x: x[1])[0]
-
-       top_borough = next(b for b in updated_selections if b['name'] == best_investment)
-       details_content = html.Div([
-           html.H3("Best Investment Borough",
-                  style={"textAlign": "center", "color": "darkred","fontSize":"23px","marginTop": "5px"}),
-           html.Div([
-               html.Div([
-                   html.Div([
-                       html.H4(f"{top_borough['name']}",
-                           style={"color": "#333", "marginTop": "10px","fontSize":"20px"}),
-                       html.P([
-                           "Total Listings: ",
-                           html.Strong(f"{top_borough['listings']:,}")
-                       ], style={"marginBottom": "12px", "fontSize": "16px"}),
-                       html.P([
-                           "Tourism Value: ",
-                           html.Strong(f"${top_borough['tourism']:,}M")
-                       ], style={"marginBottom": "12px", "fontSize": "16px"}),
-                       html.P([
-                           "Crime Rank: ",
-                           html.Strong(f"{top_borough['crime_rank']}")
-                       ], style={"marginBottom": "12px", "fontSize": "16px"}),
-                       html.P([
-                           "Investment Rank: ",
-                           html.Strong(f"{top_borough['investment_rank']}")
-                       ], style={"marginBottom": "12px", "fontSize": "16px"})
-                   ])
-               ], style={"width": "30%"}),
-
-               html.Div([
-                   html.Img(
-                       src=borough_images[top_borough['name']],
-                       style={
-                           "width": "100%",
-                           "height": "300px",
-                           "objectFit": "cover",
-                           "borderRadius": "8px"
-                       }
-                   )
-               ], style={"width": "65%"})
-           ], style={
-               "display": "flex",
-               "alignItems": "flex-start",
-               "justifyContent": "space-between"
-           })
-       ], style={
-           "backgroundColor": "white",
-           "borderRadius": "10px",
-           "padding": "20px"
-       })
-
-   return (
-       updated_selections,
-       generate_borough_cards(updated_selections),
-       create_price_figure(selected_borough_names),
-       create_room_figure(selected_borough_names),
-       details_content
-   )
+@metrics.timed(metrics.CALLBACK_SECONDS, 'update_viewport')
+def update_viewport(viewport):
+    """密度圖縮放或平移後，以 R*Tree 只查詢可見範圍內的房源，並依繪圖區大小降採樣"""
+    CALLBACK_COUNTS['update_viewport'] += 1
+    viewport = viewport or {}
+    patch = viewport_update(
+        viewport.get('relayout'),
+        width_px=viewport.get('width'),
+        height_px=viewport.get('height')
+    )
+    if patch is None:
+        raise dash.exceptions.PreventUpdate
+    return patch
+
+
+if BACKGROUND_CALLBACKS:
+    @app.callback(
+        Output('room-graph', 'figure'),
+        Input('selected-boroughs-store', 'data'),
+        background=True,
+        running=[(Output('room-progress', 'style'), {"display": "block", "width": "100%"}, {"display": "none"})],
+        progress=[Output('room-progress', 'value'), Output('room-progress', 'max')],
+        prevent_initial_call=True
+    )
+    def update_room_figure(set_progress, selections):
+        """在 background 行程中建立房型圖；選擇再次改變時 Dash 會終止尚未完成的工作"""
+        CALLBACK_COUNTS['update_room_figure'] += 1
+        names = [b['name'] for b in selections or []]
+        if figure_cache.room_key(names) in figure_cache.cache:
+            return figure_cache.room_figure(names)
+        try:
+            return create_room_figure(
+                names,
+                progress=lambda step, total: set_progress((str(step), str(total)))
+            )
+        except Exception as e:
+            print(f"Error creating room figure: {e}")
+            return create_room_error_figure()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,137 @@
+// 行政區選擇卡片與「Best Investment Borough」面板改在瀏覽器端產生，
+// 資料來源為 selected-boroughs-store 與靜態的 borough-ranks-store，不需往返伺服器。
+
+(function () {
+    // 產生 dash_html_components 元件的 JSON
+    function h(type, props, children) {
+        props = Object.assign({}, props || {});
+        if (children !== undefined) {
+            props.children = children;
+        }
+        return {type: type, namespace: 'dash_html_components', props: props};
+    }
+
+    function formatNumber(value) {
+        return Number(value).toLocaleString('en-US');
+    }
+
+    function generateBoroughCards(selections, ranks) {
+        if (!selections || selections.length === 0) {
+            return h('Div', {style: {textAlign: 'center', color: '#666'}},
+                'Click on boroughs to see details');
+        }
+
+        // 根據 investment_rank 排序
+        var sorted = selections.slice().sort(function (a, b) {
+            return a.investment_rank - b.investment_rank;
+        });
+
+        return h('Div', {style: {display: 'flex', flexDirection: 'column', gap: '3px'}},
+            sorted.map(function (b) {
+                return h('Div', {}, [
+                    h('Div', {
+                        style: {
+                            position: 'relative',
+                            padding: '10px',
+                            marginBottom: '10px',
+                            borderRadius: '8px',
+                            backgroundColor: ranks[b.name].color,
+                            boxShadow: '0 1px 3px rgba(0,0,0,0.1)',
+                            height: '45px',
+                            width: '92%'
+                        }
+                    }, [
+                        h('Button', {
+                            id: {type: 'close-button', index: b.name},
+                            style: {
+                                position: 'absolute',
+                                right: '8px',
+                                top: '50%',
+                                background: 'none',
+                                border: 'none',
+                                fontSize: '14px',
+                                cursor: 'pointer',
+                                color: '#666',
+                                padding: '4px'
+                            }
+                        }, '×'),
+                        h('H4', {style: {margin: '0 0 10px 0', color: '#333', fontSize: '20px'}}, b.name),
+                        h('P', {
+                            style: {margin: '0', fontSize: '14px', color: '#FF4500', fontWeight: 'bold'}
+                        }, ['Investment Rank: ', h('Strong', {}, String(b.investment_rank))])
+                    ])
+                ]);
+            })
+        );
+    }
+
+    function detailLine(label, value) {
+        return h('P', {style: {marginBottom: '12px', fontSize: '16px'}},
+            [label, h('Strong', {}, value)]);
+    }
+
+    function generateBoroughDetails(selections, ranks) {
+        if (!selections || selections.length === 0) {
+            return h('Div', {style: {textAlign: 'center', color: 'gray'}},
+                'Select a borough to see details');
+        }
+
+        // investment_rank 最小者為最佳投資行政區
+        var top = selections.reduce(function (best, b) {
+            return b.investment_rank < best.investment_rank ? b : best;
+        });
+
+        return h('Div', {style: {backgroundColor: 'white', borderRadius: '10px', padding: '20px'}}, [
+            h('H3', {
+                style: {textAlign: 'center', color: 'darkred', fontSize: '23px', marginTop: '5px'}
+            }, 'Best Investment Borough'),
+            h('Div', {
+                style: {display: 'flex', alignItems: 'flex-start', justifyContent: 'space-between'}
+            }, [
+                h('Div', {style: {width: '30%'}}, [
+                    h('Div', {}, [
+                        h('H4', {style: {color: '#333', marginTop: '10px', fontSize: '20px'}}, top.name),
+                        detailLine('Total Listings: ', formatNumber(top.listings)),
+                        detailLine('Tourism Value: ', '$' + formatNumber(top.tourism) + 'M'),
+                        detailLine('Crime Rank: ', String(top.crime_rank)),
+                        detailLine('Investment Rank: ', String(top.investment_rank))
+                    ])
+                ]),
+                h('Div', {style: {width: '65%', overflow: 'hidden'}}, [
+                    h('Img', {
+                        src: ranks[top.name].image,
+                        style: {
+                            width: '100%',
+                            height: '300px',
+                            objectFit: 'cover',
+                            borderRadius: '8px',
+                            maxHeight: '350px',
+                            display: 'block'
+                        }
+                    })
+                ])
+            ])
+        ]);
+    }
+
+    // 密度圖縮放後，連同繪圖區的像素大小一起送到伺服器，供房源點降採樣使用
+    function densityViewport(relayoutData) {
+        var graph = document.querySelector('#density-graph .js-plotly-plot');
+        var size = graph && graph._fullLayout ? graph._fullLayout._size : null;
+        return {
+            relayout: relayoutData,
+            width: size ? Math.round(size.w) : null,
+            height: size ? Math.round(size.h) : null
+        };
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        boroughs: {
+            render_cards: generateBoroughCards,
+            render_details: generateBoroughDetails
+        },
+        density: {
+            viewport: densityViewport
+        }
+    });
+})();
@@ -0,0 +1,347 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+import plotly.graph_objects as go
+
+import dataset
+import db
+import figure_cache
+import figure_json
+import figure_points
+import snapshot
+from figure_cache import BOROUGHS, all_selections
+from fig_crime import create_crime_figure
+from fig_density import create_density_figure, viewport_update
+from fig_map import create_map_figure
+from fig_neighborhood import create_neighborhood_figure
+from fig_potential import create_potential_figure
+from fig_price import create_price_figure
+from fig_room import create_room_figure
+from tests.conftest import POINT_COUNTS, VIEWPORTS, CallbackDriver, selection_actions, synthetic_points
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+# 房型圖測試的價格範圍（None 為預設的 95 百分位）
+PRICE_RANGES = [None, [0, 250], [0, 500], [0, 2000]]
+
+# 與 baseline 相比，延遲低於此毫秒數的差異視為雜訊
+LATENCY_NOISE_MS = 1.0
+
+# 峰值記憶體受 GC 時機影響，低於此位元組數的差異視為雜訊
+MEMORY_NOISE_BYTES = 1024 * 1024
+
+
+@contextmanager
+def sqlite_path():
+    """暫時關閉記憶體資料集，讓圖表回到 SQLite 查詢"""
+    previous = dataset.IN_MEMORY_DATASET
+    dataset.IN_MEMORY_DATASET = False
+    try:
+        yield
+    finally:
+        dataset.IN_MEMORY_DATASET = previous
+
+
+@contextmanager
+def figure_workers(workers):
+    """暫時改變執行緒池大小（0 為 callback 依序建立圖表）"""
+    previous = figure_cache.FIGURE_WORKERS
+    figure_cache.FIGURE_WORKERS = workers
+    try:
+        yield
+    finally:
+        figure_cache.FIGURE_WORKERS = previous
+
+
+def payload_size(result):
+    """figure、dict 或 HTTP 回應內容序列化後的位元組數"""
+    if isinstance(result, bytes):
+        return len(result)
+    if isinstance(result, str):
+        return len(result.encode())
+    from dash import Patch
+    from figure_patch import payload_size as patch_payload_size
+    if hasattr(result, 'to_json') and not isinstance(result, Patch):
+        return len(result.to_json().encode())
+    return patch_payload_size(result)
+
+
+_snapshot_dir = None
+
+
+def snapshot_tmp_dir():
+    """把目前的資料庫匯出成快照到暫存目錄（只做一次），回傳目錄路徑"""
+    global _snapshot_dir
+    if _snapshot_dir is None:
+        _snapshot_dir = tempfile.mkdtemp(prefix='dataset-snapshot-')
+        snapshot.build_snapshot(snapshot_dir=_snapshot_dir)
+    return _snapshot_dir
+
+
+def case_calls(name):
+    """回傳案例的 (setup, calls)，calls 為無參數函式列表，每個回傳要量測大小的結果"""
+    if name == 'price_figure':
+        return None, [lambda s=s: create_price_figure(list(s)) for s in all_selections()]
+
+    if name == 'price_figure_sqlite':
+        def call(s):
+            with sqlite_path():
+                return create_price_figure(list(s))
+        return None, [lambda s=s: call(s) for s in all_selections()]
+
+    if name == 'room_figure':
+        return None, [
+            lambda s=s, r=r: create_room_figure(list(s), y_range=r)
+            for s in all_selections() for r in PRICE_RANGES
+        ]
+
+    if name == 'room_figure_full':
+        return None, [lambda s=s: create_room_figure(list(s), summary=False) for s in all_selections()]
+
+    if name == 'room_figure_sqlite':
+        def call(s):
+            with sqlite_path():
+                return create_room_figure(list(s))
+        return None, [lambda s=s: call(s) for s in all_selections()]
+
+    if name in ('room_json', 'room_json_plotly'):
+        # 只量測序列化：先建立單一行政區與全部行政區的房型圖（摘要與完整模式）
+        figures = [
+            create_room_figure(list(s), summary=summary)
+            for s in all_selections() if len(s) <= 1
+            for summary in (True, False)
+        ]
+        encode = figure_json.to_json if name == 'room_json' else (lambda fig: fig.to_json())
+        return None, [lambda fig=fig: encode(fig) for fig in figures]
+
+    if name == 'density_figure':
+        return None, [create_density_figure]
+
+    if name == 'density_figure_sqlite':
+        def call():
+            with sqlite_path():
+                return create_density_figure()
+        return None, [call]
+
+    if name == 'neighborhood_figure':
+        return None, [lambda b=b: create_neighborhood_figure(b) for b in BOROUGHS]
+
+    if name == 'viewport':
+        return None, [lambda r=r: viewport_update(r) for r in VIEWPORTS]
+
+    if name.startswith('points_'):
+        # 散佈點 figure 的建立與序列化：_raw 為全部點以 SVG 繪製，其餘經 figure_points 降採樣
+        x, y, ids = synthetic_points(POINT_COUNTS[name.split('_')[1]])
+        if name.endswith('_raw'):
+            def build():
+                return go.Scatter(x=x, y=y, customdata=ids, mode='markers')
+        else:
+            def build():
+                return figure_points.point_trace(x, y, customdata=ids, mode='markers')
+        return None, [lambda: figure_json.to_json(go.Figure(build()))]
+
+    if name.startswith('startup_'):
+        # worker 啟動時載入資料集：直接查詢 SQLite，或讀取暫存目錄中的 Parquet / 記憶體映射的 Arrow 快照
+        if name == 'startup_sqlite':
+            def load():
+                return dataset.ListingDataset(db.read_sql_query(dataset.DATASET_QUERY, name='dataset'))
+        else:
+            snapshot_dir = snapshot_tmp_dir()
+
+            def load():
+                return dataset.ListingDataset(
+                    snapshot.read_snapshot(snapshot_dir=snapshot_dir, use_arrow=name == 'startup_arrow'))
+        # 資料集不會傳給瀏覽器，payload 記為 0
+        return None, [lambda: load() and b'']
+
+    if name == 'static_figures':
+        return None, [create_map_figure, create_potential_figure, create_crime_figure]
+
+    if name in ('callbacks', 'callbacks_serial', 'callbacks_pool', 'callbacks_cached'):
+        driver = CallbackDriver()
+
+        def setup():
+            driver.selections = []
+            driver.figure_status = {}
+            if name == 'callbacks_cached':
+                figure_cache.warm_up()
+            else:
+                figure_cache.cache.clear()
+
+        if name in ('callbacks_serial', 'callbacks_pool'):
+            # 與預設設定比較：依序建立，或固定以 2 個執行緒並行建立
+            workers = 0 if name == 'callbacks_serial' else 2
+
+            def send(action):
+                with figure_workers(workers):
+                    return driver.send(action)
+            return setup, [lambda a=a: send(a) for a in selection_actions()]
+
+        return setup, [lambda a=a: driver.send(a) for a in selection_actions()]
+
+    if name == 'layout':
+        driver = CallbackDriver()
+        return None, [lambda: driver.client.get('/_dash-layout').data]
+
+    raise ValueError(f"Unknown benchmark case: {name}")
+
+
+CASES = [
+    'price_figure',
+    'price_figure_sqlite',
+    'room_figure',
+    'room_figure_full',
+    'room_figure_sqlite',
+    'room_json',
+    'room_json_plotly',
+    'density_figure',
+    'density_figure_sqlite',
+    'neighborhood_figure',
+    'viewport',
+    'points_10k',
+    'points_10k_raw',
+    'points_100k',
+    'points_100k_raw',
+    'points_1m',
+    'points_1m_raw',
+    'static_figures',
+    'callbacks',
+    'callbacks_serial',
+    'callbacks_pool',
+    'callbacks_cached',
+    'layout',
+    'startup_sqlite',
+]
+
+# 快照案例需要 pyarrow（選用套件）
+if snapshot.pa is not None:
+    CASES += ['startup_parquet', 'startup_arrow']
+
+
+def run_case(name, repeat):
+    """執行案例：延遲（不含 tracemalloc）、峰值記憶體與平均 payload 大小"""
+    setup, calls = case_calls(name)
+
+    timings = []
+    payloads = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        for call in calls:
+            start = time.perf_counter()
+            result = call()
+            timings.append((time.perf_counter() - start) * 1000)
+            payloads.append(payload_size(result))
+
+    # 另跑一輪量測峰值記憶體，避免 tracemalloc 影響延遲數據
+    if setup:
+        setup()
+    tracemalloc.start()
+    for call in calls:
+        call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'calls': len(timings),
+        'mean_ms': float(np.mean(timings)),
+        'p50_ms': float(np.percentile(timings, 50)),
+        'p95_ms': float(np.percentile(timings, 95)),
+        'peak_memory_bytes': int(peak),
+        'payload_bytes': int(np.mean(payloads)),
+    }
+
+
+def machine_info():
+    """記錄在 baseline 中的機器資訊：延遲與記憶體數據只能和同一類機器比較"""
+    return {
+        'cpu_count': os.cpu_count(),
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+    }
+
+
+def compare_to_baseline(results, baseline, threshold):
+    """回傳超過門檻的退步項目"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'peak_memory_bytes', 'payload_bytes'):
+            old, new = base[metric], result[metric]
+            if metric.endswith('_ms') and new - old < LATENCY_NOISE_MS:
+                continue
+            if metric == 'peak_memory_bytes' and new - old < MEMORY_NOISE_BYTES:
+                continue
+            if old > 0 and (new - old) / old > threshold:
+                regressions.append((name, metric, old, new))
+    return regressions
+
+
+def print_results(results):
+    print(f"{'case':<22}{'calls':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'peak KiB':>11}{'payload B':>12}")
+    for name, r in results.items():
+        print(f"{name:<22}{r['calls']:>7}{r['mean_ms']:>10.2f}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+              f"{r['peak_memory_bytes'] / 1024:>11.0f}{r['payload_bytes']:>12,}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="儀表板 callback 與圖表建立的效能基準測試")
+    parser.add_argument("--case", action="append", choices=CASES,
+                        help="只執行指定案例（可重複指定，預設全部）")
+    parser.add_argument("--repeat", type=int, default=3, help="每個案例重複次數")
+    parser.add_argument("--db", help="改用其他資料庫（例如 generate_data.py 產生的 db_x100.sqlite3）")
+    parser.add_argument("--baseline", help="baseline 結果檔（預設依資料庫命名）")
+    parser.add_argument("--save-baseline", action="store_true", help="以這次結果覆寫 baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="相對 baseline 允許的退步比例（預設 0.25 = 25%%）")
+    args = parser.parse_args()
+
+    if args.db:
+        db.set_db_path(args.db)
+        dataset.reset_dataset()
+    if not args.baseline:
+        args.baseline = BASELINE_PATH
+        if args.db:
+            stem = os.path.splitext(os.path.basename(args.db))[0]
+            args.baseline = BASELINE_PATH.replace('.json', f'_{stem}.json')
+
+    dataset.get_dataset()
+    results = {name: run_case(name, args.repeat) for name in (args.case or CASES)}
+    print_results(results)
+
+    failures = []
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        baseline['_machine'] = machine_info()
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('_machine') != machine_info():
+            print(f"Warning: baseline was recorded on {baseline.get('_machine')}, this machine is {machine_info()}; "
+                  "regenerate it with --save-baseline before trusting the comparison")
+        for name, metric, old, new in compare_to_baseline(results, baseline, args.threshold):
+            failures.append(f"{name} {metric} regressed: {old:,.2f} -> {new:,.2f}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
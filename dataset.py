@@ -0,0 +1,133 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import db
+
+
+# 是否在記憶體中保留整份房源資料（設為 0 則每次回到 SQLite 查詢）
+IN_MEMORY_DATASET = os.environ.get('IN_MEMORY_DATASET', '1') == '1'
+
+# 有最新的欄式快照（python snapshot.py 產生）時由快照載入（設為 0 則一律查詢 SQLite）
+DATASET_SNAPSHOT = os.environ.get('DATASET_SNAPSHOT', '1') == '1'
+
+# 載入全部房源所用的查詢（與 fig_price / fig_room 的連接方式相同）
+DATASET_QUERY = """
+SELECT
+    b.borough_name AS borough,
+    l.listing_id,
+    h.host_name,
+    l.room_type,
+    l.price,
+    loc.latitude,
+    loc.longitude
+FROM
+    listings l
+JOIN
+    locations loc ON l.listing_id = loc.listing_id
+JOIN
+    borough b ON loc.borough_id = b.borough_id
+LEFT JOIN
+    hosts h ON l.host_id = h.host_id
+"""
+
+_dataset = None
+_lock = threading.Lock()
+
+
+class ListingDataset:
+    """以欄為單位存放的房源資料，篩選與彙總皆以向量化運算完成
+
+    df 為 DATASET_QUERY 的查詢結果，或 snapshot.read_snapshot 回傳的 {欄位: pd.Series}。
+    """
+
+    def __init__(self, df):
+        self.borough = pd.Categorical(df['borough'])
+        self.room_type = pd.Categorical(df['room_type'])
+        self.host_name = pd.Categorical(df['host_name'])
+        self.listing_id = df['listing_id'].to_numpy(dtype=np.int64)
+        self.price = df['price'].to_numpy()
+        self.has_host = df['host_name'].notna().to_numpy()
+        self.latitude = df['latitude'].to_numpy(dtype=np.float64)
+        self.longitude = df['longitude'].to_numpy(dtype=np.float64)
+
+        self.boroughs = list(self.borough.categories)
+        self._borough_codes = self.borough.codes
+
+    def __len__(self):
+        return len(self.price)
+
+    def borough_mask(self, selected_boroughs=None):
+        """回傳屬於所選行政區的布林遮罩（未選擇時為全部）"""
+        if not selected_boroughs:
+            return np.ones(len(self), dtype=bool)
+        wanted = [self.boroughs.index(b) for b in selected_boroughs if b in self.boroughs]
+        return np.isin(self._borough_codes, wanted)
+
+    def price_summary(self, selected_boroughs=None):
+        """各行政區平均房價與房源數量（對應 fig_price 的查詢結果）"""
+        with np.errstate(invalid='ignore'):
+            mask = self.borough_mask(selected_boroughs) & (self.price > 0)
+        codes = self._borough_codes[mask]
+        counts = np.bincount(codes, minlength=len(self.boroughs))
+        sums = np.bincount(codes, weights=self.price[mask], minlength=len(self.boroughs))
+
+        present = counts > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            averages = np.round(sums / counts, 2)
+        return pd.DataFrame({
+            'borough': np.array(self.boroughs, dtype=object)[present],
+            'AveragePrice': averages[present],
+            'NumberOfProperties': counts[present]
+        })
+
+    def room_listings(self, selected_boroughs=None, min_price=0, max_price=2000):
+        """價格區間內的房源明細（對應 fig_room 的查詢結果）"""
+        with np.errstate(invalid='ignore'):
+            mask = (
+                self.borough_mask(selected_boroughs)
+                & self.has_host
+                & (self.price > min_price)
+                & (self.price < max_price)
+            )
+        return pd.DataFrame({
+            'borough': np.asarray(self.borough[mask]),
+            'listing_id': self.listing_id[mask],
+            'host_name': np.asarray(self.host_name[mask]),
+            'room_type': np.asarray(self.room_type[mask]),
+            'price': self.price[mask]
+        })
+
+    def coordinates(self, selected_boroughs=None):
+        """所選行政區房源的 (經度, 緯度, 價格) 陣列（對應 fig_density 的查詢結果）"""
+        mask = self.borough_mask(selected_boroughs)
+        return self.longitude[mask], self.latitude[mask], self.price[mask]
+
+
+def load_dataset():
+    """載入房源資料：有最新的快照時以記憶體映射讀取，否則從資料庫查詢"""
+    if DATASET_SNAPSHOT:
+        import snapshot
+        columns = snapshot.read_snapshot()
+        if columns is not None:
+            return ListingDataset(columns)
+    return ListingDataset(db.read_sql_query(DATASET_QUERY, name='dataset'))
+
+
+def get_dataset():
+    """取得本行程共用的資料集（第一次呼叫時載入）"""
+    global _dataset
+    if _dataset is None:
+        with _lock:
+            if _dataset is None:
+                _dataset = load_dataset()
+    return _dataset
+
+
+def reset_dataset():
+    """清除已載入的資料集，下次使用時重新載入"""
+    global _dataset
+    with _lock:
+        _dataset = None
@@ -0,0 +1,121 @@
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+import metrics
+
+
+# 資料庫路徑（可用環境變數 DB_PATH 覆寫，預設為專案內的 db_final.sqlite3）
+DB_PATH = os.environ.get(
+    'DB_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'db_final.sqlite3')
+)
+
+# 每條連線保留的 prepared statement 數量
+STATEMENT_CACHE_SIZE = int(os.environ.get('DB_STATEMENT_CACHE_SIZE', '128'))
+
+# 部署期間資料庫不會變動，預設以 immutable 模式開啟以省去檔案鎖
+DB_IMMUTABLE = os.environ.get('DB_IMMUTABLE', '1') == '1'
+
+# 行政區篩選條件：以單一綁定參數（JSON 陣列）傳入選擇，所有組合共用同一個 SQL 文字，
+# 可重複使用連線上快取的 prepared statement（查詢需將 borough 表別名為 b）
+BOROUGH_FILTER = "(:boroughs IS NULL OR b.borough_name IN (SELECT value FROM json_each(:boroughs)))"
+
+_local = threading.local()
+_lock = threading.Lock()
+_connections = []
+_statements = {}
+_pid = os.getpid()
+
+
+def _connection_uri(db_path):
+    """組成唯讀 SQLite URI"""
+    uri = Path(db_path).resolve().as_uri() + '?mode=ro'
+    if DB_IMMUTABLE:
+        uri += '&immutable=1'
+    return uri
+
+
+def _reset_after_fork():
+    """gunicorn fork 出新 worker 後，不沿用父行程的連線"""
+    global _pid, _local
+    if os.getpid() != _pid:
+        with _lock:
+            if os.getpid() != _pid:
+                _pid = os.getpid()
+                _connections.clear()
+                _local = threading.local()
+
+
+def get_connection():
+    """取得目前 worker / 執行緒共用的唯讀資料庫連線"""
+    _reset_after_fork()
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(
+            _connection_uri(DB_PATH),
+            uri=True,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+        _local.conn = conn
+        with _lock:
+            _connections.append(conn)
+    return conn
+
+
+def borough_params(selected_boroughs=None):
+    """BOROUGH_FILTER 的綁定參數（未選擇時為 NULL，不篩選）"""
+    return {'boroughs': json.dumps(list(selected_boroughs)) if selected_boroughs else None}
+
+
+def read_sql_query(query, params=None, name='query', fresh=False):
+    """以共用連線執行查詢並回傳 DataFrame（name 為 /metrics 上的查詢標籤）
+
+    fresh 為 True 時改用一條用完即關、非 immutable 的唯讀連線，
+    可讀到資料庫檔案被更新或替換（ingest.py）後的內容。
+    """
+    with _lock:
+        _statements.setdefault(name, set()).add(query)
+    with metrics.timer(metrics.SQL_QUERY_SECONDS, name):
+        if not fresh:
+            return pd.read_sql_query(query, get_connection(), params=params)
+        conn = sqlite3.connect(Path(DB_PATH).resolve().as_uri() + '?mode=ro', uri=True)
+        try:
+            return pd.read_sql_query(query, conn, params=params)
+        finally:
+            conn.close()
+
+
+def statement_counts():
+    """每個查詢標籤執行過幾種不同的 SQL 文字（1 表示所有參數組合共用同一個 prepared statement）"""
+    with _lock:
+        return {name: len(texts) for name, texts in _statements.items()}
+
+
+def close_connections():
+    """關閉本 worker 開啟的所有連線"""
+    global _local
+    with _lock:
+        for conn in _connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _connections.clear()
+        _local = threading.local()
+
+
+def set_db_path(db_path):
+    """切換資料庫路徑（例如測試或壓測用的資料庫），並重建連線池"""
+    global DB_PATH
+    close_connections()
+    DB_PATH = db_path
+
+
+metrics.register_gauge('dashboard_sql_distinct_statements', 'Distinct SQL texts executed', 'gauge',
+                       lambda: sum(statement_counts().values()))
@@ -1,67 +1,52 @@
 import dash
 from dash import dcc, html
-import pandas as pd
 import plotly.graph_objects as go
-import sqlite3
-import os
-import psycopg2
+import db
 
-def get_db_connection():
-    """根據環境返回正確的資料庫連線"""
-    # if os.environ.get('ENV') == 'production':
-    #     # 使用 PostgreSQL 連線
-    #     DATABASE_URL = os.environ.get('DATABASE_URL')
-    #     conn = psycopg2.connect(DATABASE_URL, sslmode='require')
-    # else:
-    #     # 使用 SQLite 在本地開發環境
-    # db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'db_final.db')
-    db_path = 'db_final.sqlite3'
-    conn = sqlite3.connect(db_path)
 
-    return conn
+# SQL 查詢（各行政區犯罪件數來自 borough_crime_stats 彙總表）
+CRIME_QUERY = """
+WITH CrimeCounts AS (
+    SELECT 
+        b.borough_name AS borough,
+        NULLIF(c.crime_level, '') AS crime_type,
+        IFNULL(c.event_count, 0) AS crime_count
+    FROM 
+        borough b
+    LEFT JOIN 
+        borough_crime_stats c ON b.borough_id = c.borough_id AND c.event_count > 0
+),
+BoroughTotals AS (
+    SELECT 
+        borough,
+        SUM(crime_count) as total_crimes
+    FROM 
+        CrimeCounts
+    GROUP BY 
+        borough
+)
+SELECT 
+    c.borough,
+    c.crime_type,
+    c.crime_count,
+    CAST(c.crime_count AS FLOAT) / b.total_crimes * 100 as crime_percentage
+FROM 
+    CrimeCounts c
+JOIN 
+    BoroughTotals b ON c.borough = b.borough
+ORDER BY c.borough;
+"""
 
 
 def create_crime_figure():
     """創建犯罪分布堆疊百分比柱狀圖"""
-    query = """
-    WITH CrimeCounts AS (
-        SELECT 
-            b.borough_name AS borough,
-            s.crime_level AS crime_type,
-            COUNT(s.Event_id) AS crime_count
-        FROM 
-            borough b
-        LEFT JOIN 
-            security s ON b.borough_id = s.borough_id
-        GROUP BY 
-            b.borough_id, b.borough_name, s.crime_level
-    ),
-    BoroughTotals AS (
-        SELECT 
-            borough,
-            SUM(crime_count) as total_crimes
-        FROM 
-            CrimeCounts
-        GROUP BY 
-            borough
-    )
-    SELECT 
-        c.borough,
-        c.crime_type,
-        c.crime_count,
-        CAST(c.crime_count AS FLOAT) / b.total_crimes * 100 as crime_percentage
-    FROM 
-        CrimeCounts c
-    JOIN 
-        BoroughTotals b ON c.borough = b.borough
-    ORDER BY c.borough;
-    """
-    # try:
-    conn = get_db_connection()
-
-    df = pd.read_sql_query(query, conn)
-    if df.empty:
-        raise ValueError("Database query returned no results")
+    try:
+        df = db.read_sql_query(CRIME_QUERY, name='crime')
+        if df.empty:
+            raise ValueError("Database query returned no results")
+    except Exception as e:
+        print(f"Error creating crime figure: {e}")
+        return create_crime_error_figure()
 
     df = df.dropna(subset=["borough", "crime_type"])
     pivot_df = df.pivot(index="borough", columns="crime_type", values="crime_count").fillna(0)
@@ -86,7 +71,9 @@ def create_crime_figure():
             y=counts,
             name=crime_type.title(),  # 首字母大寫
             marker=dict(color=custom_colors[crime_type]),
-            text=[f"{pct:.1f}%" for pct in percentages],
+            # 百分比以 NumPy 陣列傳送，由瀏覽器格式化
+            customdata=percentages.to_numpy(),
+            texttemplate="%{customdata:.1f}%",
             textposition="inside",
             insidetextanchor="middle",
             textfont=dict(
@@ -97,7 +84,7 @@ def create_crime_figure():
                 "<b>%{x}</b><br>" +
                 f"Crime Type: {crime_type.title()}<br>" +
                 "Count: %{y:,}<br>" +
-                "Percentage: %{text}<br>" +
+                "Percentage: %{customdata:.1f}%<br>" +
                 "<extra></extra>"
             )
         ))
@@ -144,6 +131,22 @@ def create_crime_figure():
 
     return fig
 
+
+def create_crime_error_figure():
+    """犯罪資料無法載入時顯示的圖表"""
+    fig = go.Figure()
+    fig.update_layout(
+        title="Error Loading Crime Data",
+        annotations=[{
+            "text": "Error loading crime data. Please check database connection.",
+            "xref": "paper",
+            "yref": "paper",
+            "showarrow": False,
+            "font": {"size": 14}
+        }]
+    )
+    return fig
+
 # 測試用主程式
 if __name__ == "__main__":
     app = dash.Dash(__name__)
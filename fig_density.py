@@ -0,0 +1,347 @@
+import dash
+from dash import dcc, html
+from dash.dependencies import Input, Output
+import numpy as np
+import plotly.graph_objects as go
+import os
+import db
+import dataset
+import figure_points
+
+
+# 網格在經度方向的格數（緯度方向依實際距離換算，讓每格接近正方形）
+DENSITY_GRID_SIZE = int(os.environ.get('DENSITY_GRID_SIZE', '60'))
+
+# 紐約市範圍（經度、緯度），固定範圍讓不同資料量的網格位置一致
+NYC_BOUNDS = {
+    'lon': (-74.26, -73.70),
+    'lat': (40.49, 40.92)
+}
+
+# 各房源座標與價格（行政區以綁定參數篩選）
+DENSITY_QUERY = f"""
+SELECT
+    loc.longitude,
+    loc.latitude,
+    l.price
+FROM
+    listings l
+JOIN
+    locations loc ON l.listing_id = loc.listing_id
+JOIN
+    borough b ON loc.borough_id = b.borough_id
+WHERE
+    loc.longitude IS NOT NULL
+    AND loc.latitude IS NOT NULL
+    AND {db.BOROUGH_FILTER}
+"""
+
+# 縮放後可見範圍內最多顯示的房源點數，超過時只顯示密度網格
+VIEWPORT_MAX_POINTS = int(os.environ.get('VIEWPORT_MAX_POINTS', '5000'))
+
+# 可見範圍內的 R*Tree 項目數，最多數到 :limit 筆（只讀索引，不讀房源資料；
+# 邊界上的點依 32 位元座標計入，只用來判斷是否超過上限）
+VIEWPORT_COUNT_QUERY = """
+SELECT
+    COUNT(*) AS listings
+FROM (
+    SELECT 1
+    FROM locations_rtree r
+    WHERE
+        r.max_lon >= :lon_min AND r.min_lon <= :lon_max
+        AND r.max_lat >= :lat_min AND r.min_lat <= :lat_max
+    LIMIT :limit
+)
+"""
+
+# 可見範圍內的房源：先以 R*Tree 找出範圍內的 location，再以主鍵取得座標與房源資料
+# （R*Tree 以 32 位元浮點數存放座標，邊界另以原始座標精確比較）
+VIEWPORT_QUERY = """
+SELECT
+    loc.longitude,
+    loc.latitude,
+    l.listing_id,
+    l.room_type,
+    l.price
+FROM
+    locations_rtree r
+JOIN
+    locations loc ON loc.location_id = r.id
+JOIN
+    listings l ON l.listing_id = loc.listing_id
+WHERE
+    r.max_lon >= :lon_min AND r.min_lon <= :lon_max
+    AND r.max_lat >= :lat_min AND r.min_lat <= :lat_max
+    AND loc.longitude BETWEEN :lon_min AND :lon_max
+    AND loc.latitude BETWEEN :lat_min AND :lat_max
+LIMIT :limit
+"""
+
+
+def grid_edges(grid_size=DENSITY_GRID_SIZE, bounds=NYC_BOUNDS):
+    """回傳 (經度邊界, 緯度邊界)；緯度格距依中心緯度的 cos 換算成相同距離"""
+    lon_min, lon_max = bounds['lon']
+    lat_min, lat_max = bounds['lat']
+    lon_step = (lon_max - lon_min) / grid_size
+    lat_step = lon_step * np.cos(np.radians((lat_min + lat_max) / 2))
+    lat_cells = int(np.ceil((lat_max - lat_min) / lat_step))
+    return (
+        np.linspace(lon_min, lon_max, grid_size + 1),
+        lat_min + lat_step * np.arange(lat_cells + 1)
+    )
+
+
+def compute_density_grid(longitude, latitude, price, grid_size=DENSITY_GRID_SIZE, bounds=NYC_BOUNDS):
+    """把座標分到網格，回傳每格房源數與平均價格（沒有房源的格子為 NaN）
+
+    回傳 dict：lon / lat 為格子中心，count / avg_price 為 (緯度格數, 經度格數) 的陣列。
+    """
+    lon_edges, lat_edges = grid_edges(grid_size, bounds)
+    price = np.asarray(price, dtype=np.float64)
+    priced = price > 0
+
+    counts, _, _ = np.histogram2d(longitude, latitude, bins=[lon_edges, lat_edges])
+    price_sums, _, _ = np.histogram2d(longitude, latitude, bins=[lon_edges, lat_edges],
+                                      weights=np.where(priced, price, 0))
+    price_counts, _, _ = np.histogram2d(longitude, latitude, bins=[lon_edges, lat_edges],
+                                        weights=priced.astype(np.float64))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg_price = np.round(price_sums / price_counts, 2)
+
+    # histogram2d 以 (x, y) 排列，Heatmap 需要 (y, x)
+    counts = counts.T
+    avg_price = avg_price.T
+    counts[counts == 0] = np.nan
+
+    return {
+        'lon': (lon_edges[:-1] + lon_edges[1:]) / 2,
+        'lat': (lat_edges[:-1] + lat_edges[1:]) / 2,
+        'count': counts,
+        'avg_price': avg_price
+    }
+
+
+def parse_viewport(relayout_data, bounds=NYC_BOUNDS):
+    """從 relayoutData 取得可見範圍 {'lon': (最小, 最大), 'lat': (最小, 最大)}
+
+    重設縮放（autorange）時為完整範圍；只變動一個軸時另一軸視為完整範圍；
+    與縮放無關的事件（例如 autosize）回傳 None。
+    """
+    relayout_data = relayout_data or {}
+    viewport = {}
+    for axis, name in (('xaxis', 'lon'), ('yaxis', 'lat')):
+        if f'{axis}.range[0]' in relayout_data and f'{axis}.range[1]' in relayout_data:
+            low, high = relayout_data[f'{axis}.range[0]'], relayout_data[f'{axis}.range[1]']
+        elif f'{axis}.range' in relayout_data:
+            low, high = relayout_data[f'{axis}.range']
+        elif relayout_data.get(f'{axis}.autorange'):
+            low, high = bounds[name]
+        else:
+            continue
+        viewport[name] = (min(float(low), float(high)), max(float(low), float(high)))
+
+    if not viewport:
+        return None
+    for name in ('lon', 'lat'):
+        viewport.setdefault(name, bounds[name])
+    return viewport
+
+
+def viewport_params(viewport, max_points=VIEWPORT_MAX_POINTS):
+    """VIEWPORT_QUERY 的綁定參數（多讀一筆，用來判斷是否超過上限）"""
+    return {
+        'lon_min': viewport['lon'][0],
+        'lon_max': viewport['lon'][1],
+        'lat_min': viewport['lat'][0],
+        'lat_max': viewport['lat'][1],
+        'limit': max_points + 1
+    }
+
+
+def load_viewport_listings(viewport, max_points=VIEWPORT_MAX_POINTS):
+    """以 R*Tree 查詢可見範圍內的房源；超過 max_points 筆時回傳 None
+
+    先只用索引計數（最多數到 max_points + 1），範圍內房源不多時才讀取座標與房源資料。
+    """
+    params = viewport_params(viewport, max_points)
+    count = db.read_sql_query(VIEWPORT_COUNT_QUERY, params, name='viewport_count')['listings'].iloc[0]
+    if count > max_points:
+        return None
+    return db.read_sql_query(VIEWPORT_QUERY, params, name='viewport')
+
+
+def listing_points_trace():
+    """可見範圍內房源點的 trace（資料由 viewport_update 填入）"""
+    return go.Scatter(
+        x=[],
+        y=[],
+        mode='markers',
+        marker=dict(color="#4a4a4a", size=5, opacity=0.7),
+        hovertemplate=(
+            "Listing ID: %{customdata[0]}<br>" +
+            "%{customdata[1]}<br>" +
+            "Price: $%{customdata[2]:,.0f}" +
+            "<extra></extra>"
+        ),
+        name="Listings",
+        showlegend=False
+    )
+
+
+def viewport_update(relayout_data, max_points=VIEWPORT_MAX_POINTS, width_px=None, height_px=None):
+    """依縮放後的可見範圍更新房源點，回傳 dash.Patch；與縮放無關的事件回傳 None
+
+    範圍內超過 max_points 筆時不顯示房源點，只保留密度網格，
+    因此每次查詢最多讀取 max_points + 1 筆，延遲不隨資料量增加。
+    點數多時依瀏覽器回報的繪圖區大小（width_px / height_px）降採樣，並改用 WebGL 繪製。
+    """
+    viewport = parse_viewport(relayout_data)
+    if viewport is None:
+        return None
+
+    points = {'type': 'scatter', 'x': [], 'y': [], 'customdata': []}
+    try:
+        df = load_viewport_listings(viewport, max_points)
+        if df is None:
+            title = "Listing Density (zoom in to see individual listings)"
+        else:
+            trace_type, x, y, customdata = figure_points.decimate_points(
+                df['longitude'].to_numpy(),
+                df['latitude'].to_numpy(),
+                df[['listing_id', 'room_type', 'price']].to_numpy(),
+                x_range=viewport['lon'],
+                y_range=viewport['lat'],
+                width_px=width_px,
+                height_px=height_px
+            )
+            points = {'type': trace_type, 'x': x, 'y': y, 'customdata': customdata}
+            title = f"Listing Density ({len(df):,} listings in view)"
+            if len(x) < len(df):
+                title = f"Listing Density ({len(df):,} listings in view, {len(x):,} drawn)"
+    except Exception as e:
+        print(f"Error loading viewport listings: {e}")
+        title = "Listing Density"
+
+    patch = dash.Patch()
+    for key, value in points.items():
+        patch['data'][1][key] = value
+    patch['layout']['title']['text'] = title
+    return patch
+
+
+def create_density_figure(selected_boroughs=None):
+    """創建房源密度網格圖（只傳送每格的房源數與平均價格，不傳送個別房源）"""
+    try:
+        if dataset.IN_MEMORY_DATASET:
+            longitude, latitude, price = dataset.get_dataset().coordinates(selected_boroughs)
+        else:
+            df = db.read_sql_query(DENSITY_QUERY, db.borough_params(selected_boroughs), name='density')
+            longitude, latitude, price = df['longitude'], df['latitude'], df['price']
+
+        grid = compute_density_grid(longitude, latitude, price)
+        occupied = grid['count'][~np.isnan(grid['count'])]
+        # 曼哈頓的格子遠比其他地區密集，色階上限取 99 百分位避免其他地區都是同一色
+        zmax = float(np.percentile(occupied, 99)) if len(occupied) else 1
+
+        fig = go.Figure(go.Heatmap(
+            x=grid['lon'],
+            y=grid['lat'],
+            z=grid['count'],
+            customdata=grid['avg_price'],
+            zmin=0,
+            zmax=zmax,
+            colorscale=[[0, "#fde6d2"], [0.5, "#EA7500"], [1, "#8C4A2F"]],
+            colorbar=dict(title="Listings"),
+            hoverongaps=False,
+            hovertemplate=(
+                "Listings: %{z:,}<br>" +
+                "Avg Price: $%{customdata:,.0f}<br>" +
+                "Lon %{x:.3f}, Lat %{y:.3f}" +
+                "<extra></extra>"
+            )
+        ))
+
+        # 縮放到夠小的範圍時，由 viewport_update 填入可見範圍內的房源點
+        fig.add_trace(listing_points_trace())
+
+        center_lat = sum(NYC_BOUNDS['lat']) / 2
+        fig.update_layout(
+            title=dict(
+                text="Listing Density",
+                x=0.5,
+                font=dict(size=18)
+            ),
+            xaxis=dict(
+                title="Longitude",
+                range=list(NYC_BOUNDS['lon']),
+                showgrid=False,
+                zeroline=False,
+                constrain="domain"
+            ),
+            yaxis=dict(
+                title="Latitude",
+                range=list(NYC_BOUNDS['lat']),
+                showgrid=False,
+                zeroline=False,
+                # 讓經緯度以相同的實際距離呈現
+                scaleanchor="x",
+                scaleratio=1 / np.cos(np.radians(center_lat)),
+                constrain="domain"
+            ),
+            template="plotly_white",
+            # 更新房源點時保留使用者的縮放範圍
+            uirevision="density",
+            height=500,
+            margin=dict(l=50, r=50, t=80, b=50)
+        )
+
+        return fig
+
+    except Exception as e:
+        print(f"Error creating density figure: {e}")
+        return create_density_error_figure()
+
+
+def create_density_error_figure():
+    """密度資料無法載入時顯示的圖表"""
+    fig = go.Figure()
+    fig.update_layout(
+        title="Error Loading Density Data",
+        annotations=[{
+            "text": "Error loading listing coordinates. Please check database connection.",
+            "xref": "paper",
+            "yref": "paper",
+            "showarrow": False,
+            "font": {"size": 14}
+        }]
+    )
+    return fig
+
+
+# 測試用主程式
+if __name__ == "__main__":
+    app = dash.Dash(__name__)
+    app.layout = html.Div([
+        html.H2("Listing Density",
+                style={'text-align': 'center'}),
+        dcc.Graph(
+            id="density-graph",
+            figure=create_density_figure(),
+            config={"displayModeBar": False}
+        )
+    ])
+
+    @app.callback(
+        Output("density-graph", "figure"),
+        Input("density-graph", "relayoutData"),
+        prevent_initial_call=True
+    )
+    def update_viewport(relayout_data):
+        # 測試用：以預設的繪圖區大小降採樣
+        patch = viewport_update(relayout_data)
+        if patch is None:
+            raise dash.exceptions.PreventUpdate
+        return patch
+
+    app.run_server(debug=True)
@@ -4,24 +4,41 @@ import pandas as pd
 import plotly.graph_objects as go
 import os
 import base64
+from functools import lru_cache
+import rankings
 
-def create_map_figure():
-    """創建地圖圖表的函數"""
+
+# 地圖背景圖片（相對於 assets 資料夾）
+MAP_IMAGE_ASSET = 'images/map_final.jpg'
+MAP_IMAGE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', MAP_IMAGE_ASSET)
+
+
+@lru_cache(maxsize=1)
+def load_map_image():
+    """讀取地圖背景圖片並轉成 base64（只讀取一次）"""
+    with open(MAP_IMAGE_PATH, 'rb') as image_file:
+        return base64.b64encode(image_file.read()).decode()
+
+
+def map_image_url(app):
+    """地圖背景圖片的靜態檔網址，附上修改時間讓瀏覽器在圖片更新時重新下載"""
+    return f"{app.get_asset_url(MAP_IMAGE_ASSET)}?v={int(os.path.getmtime(MAP_IMAGE_PATH))}"
+
+
+def create_map_figure(image_url=None, borough_data=None):
+    """創建地圖圖表的函數（image_url 為背景圖片網址，未提供時改為內嵌 base64）
+
+    borough_data 為 rankings.get_rankings() 的結果，未提供時讀取目前的排名。
+    """
     # 讀取地圖背景圖片
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    image_path = os.path.join(current_dir, 'assets', 'images', 'map_final.jpg')
+    if image_url:
+        image_source = image_url
+    else:
+        image_source = f'data:image/jpg;base64,{load_map_image()}'
     
-    with open(image_path, 'rb') as image_file:
-        encoded_image = base64.b64encode(image_file.read()).decode()
-    
-    # 創建數據
-    borough_data = {
-        "Manhattan": {"listings_count": 8038, "tourism_value": 32831},
-        "Brooklyn": {"listings_count": 7717, "tourism_value": 2973},
-        "Queens": {"listings_count": 3753, "tourism_value": 9938},
-        "Bronx": {"listings_count": 948, "tourism_value": 955},
-        "Staten Island": {"listings_count": 373, "tourism_value": 456}
-    }
+    # 各行政區房源數、觀光收入與排名（由資料庫計算並快取，資料更新後自動重算）
+    if borough_data is None:
+        borough_data = rankings.get_rankings()
 
     # 五大行政區的位置
     positions = {
@@ -38,7 +55,7 @@ def create_map_figure():
     # 設定背景圖片
     fig_map.update_layout(
         images=[dict(
-            source=f'data:image/jpg;base64,{encoded_image}',
+            source=image_source,
             xref="paper",
             yref="paper",
             x=0,
@@ -80,7 +97,9 @@ def create_map_figure():
                     bordercolor="black",
                     font=dict(size=12)
                 ),
-                customdata=[[borough, listings_count, tourism_value]],
+                # 點選時加入選擇列表的資料，與地圖上的數字來自同一份排名
+                customdata=[[borough, listings_count, tourism_value,
+                             data["crime_rank"], data["investment_rank"]]],
                 name=borough
             )
         )
@@ -123,7 +142,7 @@ if __name__ == "__main__":
         html.H1("紐約市五大行政區互動地圖", style={"text-align": "center"}),
         dcc.Graph(
             id="interactive-map",
-            figure=create_map_figure(),
+            figure=create_map_figure(map_image_url(app)),
             config={"displayModeBar": False},
             style={"width": "700px", "height": "560px", "margin": "auto"}  # 調整顯示尺寸
         )
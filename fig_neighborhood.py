@@ -0,0 +1,182 @@
+import dash
+from dash import dcc, html
+from dash.dependencies import Input, Output
+import plotly.graph_objects as go
+import os
+import db
+
+
+# 每個行政區最多顯示的街區數（依房源數取前 N 個）
+NEIGHBORHOOD_MAX_BARS = int(os.environ.get('NEIGHBORHOOD_MAX_BARS', '20'))
+
+# 所選行政區各街區 × 房型的房源數與價格總和（讀取 migration 維護的階層彙總表，
+# 以主鍵前綴只讀取該行政區的資料列，與房源數量無關）
+NEIGHBORHOOD_QUERY = """
+SELECT
+    n.neighborhood,
+    n.room_type,
+    n.listing_count,
+    n.price_sum
+FROM
+    neighborhood_price_stats n
+JOIN
+    borough b ON n.borough_id = b.borough_id
+WHERE
+    b.borough_name = :borough
+    AND n.listing_count > 0
+"""
+
+BOROUGH_COLORS = {
+    "Manhattan": "#ff928b",
+    "Brooklyn": "#efe9ae",
+    "Queens": "#cdeac0",
+    "Bronx": "#ffac81",
+    "Staten Island": "#fec3ab"
+}
+
+
+def summarize_neighborhoods(df, max_bars=NEIGHBORHOOD_MAX_BARS):
+    """把街區 × 房型的彙總列合併成每個街區一列
+
+    回傳依平均價格排序的 DataFrame：neighborhood、listings、average_price、
+    room_types（hover 用的各房型平均價格與房源數）。只保留房源數最多的 max_bars 個街區。
+    """
+    df = df.assign(neighborhood=df['neighborhood'].replace('', 'Unknown'))
+    summary = df.groupby('neighborhood')[['listing_count', 'price_sum']].sum()
+    summary = summary.nlargest(max_bars, 'listing_count')
+    summary['average_price'] = (summary['price_sum'] / summary['listing_count']).round(2)
+
+    # 各房型的平均價格與房源數（依房源數由多到少）
+    rooms = df[df['neighborhood'].isin(summary.index)].sort_values('listing_count', ascending=False)
+    room_lines = (
+        rooms['room_type'].replace('', 'Unknown') + ": $"
+        + (rooms['price_sum'] / rooms['listing_count']).map('{:,.0f}'.format)
+        + " (" + rooms['listing_count'].map('{:,}'.format) + ")"
+    )
+    summary['room_types'] = room_lines.groupby(rooms['neighborhood']).agg('<br>'.join)
+
+    return (
+        summary.rename(columns={'listing_count': 'listings'})
+        .sort_values('average_price')
+        .reset_index()[['neighborhood', 'listings', 'average_price', 'room_types']]
+    )
+
+
+def create_neighborhood_figure(borough=None, raise_errors=False):
+    """創建行政區內各街區平均房價圖表（borough 為 None 時顯示提示）
+
+    raise_errors 為 True 時查詢失敗直接拋出例外，不回傳錯誤圖表。
+    """
+    if not borough:
+        return create_neighborhood_prompt_figure()
+    try:
+        df = db.read_sql_query(NEIGHBORHOOD_QUERY, {'borough': borough}, name='neighborhood')
+        if df.empty:
+            raise ValueError(f"No neighborhood data for {borough}")
+        summary = summarize_neighborhoods(df)
+
+        fig = go.Figure(go.Bar(
+            x=summary['average_price'],
+            y=summary['neighborhood'],
+            orientation='h',
+            marker_color=BOROUGH_COLORS.get(borough, "#9c9c7c"),
+            text=summary['listings'].map('{:,}'.format),
+            textposition='outside',
+            customdata=summary['room_types'].to_numpy(),
+            hovertemplate=(
+                "<b>%{y}</b><br>" +
+                "Avg Price: $%{x:,.2f}<br>" +
+                "%{customdata}" +
+                "<extra></extra>"
+            )
+        ))
+
+        fig.update_layout(
+            title=dict(
+                text=f"{borough}: Average Price by Neighborhood",
+                x=0.5,
+                font=dict(size=18)
+            ),
+            xaxis=dict(
+                title="Average Price ($)",
+                tickformat="$,.0f",
+                gridcolor='rgba(150, 150, 150, 0.35)'
+            ),
+            yaxis=dict(
+                tickfont=dict(size=11)
+            ),
+            template="plotly_white",
+            height=max(400, 22 * len(summary) + 120),
+            margin=dict(l=160, r=50, t=80, b=50)
+        )
+
+        return fig
+
+    except Exception as e:
+        if raise_errors:
+            raise
+        print(f"Error creating neighborhood figure: {e}")
+        return create_neighborhood_error_figure()
+
+
+def create_neighborhood_prompt_figure():
+    """尚未選擇行政區時顯示的圖表"""
+    fig = go.Figure()
+    fig.update_layout(
+        title=dict(text="Average Price by Neighborhood", x=0.5, font=dict(size=18)),
+        xaxis=dict(visible=False),
+        yaxis=dict(visible=False),
+        template="plotly_white",
+        height=400,
+        annotations=[{
+            "text": "Click a borough on the map to see its neighborhoods",
+            "xref": "paper",
+            "yref": "paper",
+            "showarrow": False,
+            "font": {"size": 14, "color": "#666"}
+        }]
+    )
+    return fig
+
+
+def create_neighborhood_error_figure():
+    """街區資料無法載入時顯示的圖表"""
+    fig = go.Figure()
+    fig.update_layout(
+        title="Error Loading Neighborhood Data",
+        annotations=[{
+            "text": "Error loading neighborhood data. Please check database connection.",
+            "xref": "paper",
+            "yref": "paper",
+            "showarrow": False,
+            "font": {"size": 14}
+        }]
+    )
+    return fig
+
+
+# 測試用主程式
+if __name__ == "__main__":
+    app = dash.Dash(__name__)
+    app.layout = html.Div([
+        html.H2("Neighborhood Drill-down",
+                style={'text-align': 'center'}),
+        dcc.Dropdown(
+            id="borough-dropdown",
+            options=list(BOROUGH_COLORS),
+            value="Manhattan"
+        ),
+        dcc.Graph(
+            id="neighborhood-graph",
+            config={"displayModeBar": False}
+        )
+    ])
+
+    @app.callback(
+        Output("neighborhood-graph", "figure"),
+        Input("borough-dropdown", "value")
+    )
+    def update_neighborhoods(borough):
+        return create_neighborhood_figure(borough)
+
+    app.run_server(debug=True)
@@ -2,9 +2,26 @@ import dash
 from dash import dcc, html
 import pandas as pd
 import plotly.graph_objects as go
-import sqlite3
 import os
 import psycopg2
+import db
+
+
+# SQL 查詢（犯罪權重來自 borough_crime_stats 彙總表）
+POTENTIAL_QUERY = """
+SELECT
+    b.borough_name,
+    b.tourist_revenue,
+    SUM(c.weight_sum) as crime_score
+FROM
+    borough b
+LEFT JOIN
+    borough_crime_stats c ON b.borough_id = c.borough_id AND c.event_count > 0
+GROUP BY
+    b.borough_id, b.borough_name, b.tourist_revenue
+ORDER BY
+    b.borough_name;
+"""
 
 
 def create_potential_figure():
@@ -18,26 +35,10 @@ def create_potential_figure():
         # else:
         #     # 本地開發環境使用 SQLite
         #     current_dir = os.path.dirname(os.path.abspath(__file__))
-        db_path = 'db_final.sqlite3' # os.path.join(current_dir, 'db_final.db')
-        conn = sqlite3.connect(db_path)
-
-        # SQL 查詢
-        query = """
-        SELECT
-            b.borough_name,
-            b.tourist_revenue,
-            SUM(s.crime_level_weight) as crime_score
-        FROM
-            borough b
-        LEFT JOIN
-            security s ON b.borough_id = s.borough_id
-        GROUP BY
-            b.borough_id, b.borough_name, b.tourist_revenue
-        ORDER BY
-            b.borough_name;
-        """
+        #     db_path = os.path.join(current_dir, 'db_final.db')
+
         # 執行查詢並讀取資料
-        df = pd.read_sql_query(query, conn)
+        df = db.read_sql_query(POTENTIAL_QUERY, name='potential')
 
     except Exception as e:
         print(f"資料庫錯誤: {e}")
@@ -48,10 +49,6 @@ def create_potential_figure():
             'crime_score': [4, 1, 3, 2, 5]
         })
 
-    finally:
-        if 'conn' in locals() and conn:
-            conn.close()
-
     # 計算平均值
     avg_crime_score = df["crime_score"].mean()
     avg_tourist_revenue = df["tourist_revenue"].mean()
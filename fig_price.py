@@ -1,53 +1,42 @@
 import dash
 from dash import dcc, html
-import pandas as pd
 import plotly.graph_objects as go
-import sqlite3
-import os
-
-
-def create_price_figure(selected_boroughs=None):
-    """創建房價和房源數量分析圖表"""
+import db
+import dataset
+
+
+# 每個行政區平均房價與房源數量（讀取 ingest / migration 維護的彙總表，與房源數量無關）
+PRICE_QUERY = f"""
+SELECT
+    b.borough_name AS borough,
+    round(CAST(SUM(p.price_sum) AS FLOAT) / SUM(p.listing_count), 2) AS AveragePrice,
+    SUM(p.listing_count) AS NumberOfProperties
+FROM
+    borough_price_stats p
+JOIN
+    borough b ON p.borough_id = b.borough_id
+WHERE
+    p.listing_count > 0
+    AND {db.BOROUGH_FILTER}
+GROUP BY
+    b.borough_name
+HAVING
+    SUM(p.listing_count) > 0;
+"""
+
+
+def create_price_figure(selected_boroughs=None, raise_errors=False):
+    """創建房價和房源數量分析圖表
+
+    raise_errors 為 True 時直接拋出例外（供快取層使用，錯誤圖表不應被快取）。
+    """
     try:
-        # 根據環境選擇資料庫路徑
-        # if os.environ.get('ENV') == 'production':
-        #     db_path = os.environ.get('DATABASE_URL')  # Heroku 環境使用 DATABASE_URL
-        # else:
-        #     current_dir = os.path.dirname(os.path.abspath(__file__))
-        #     db_path = os.path.join(current_dir, 'db_final.db')  # 本地開發環境使用 SQLite
-
-        db_path = 'db_final.sqlite3'
-
-        # 建立資料庫連線
-        with sqlite3.connect(db_path) as conn:
-            # 基本查詢
-            query = """
-            SELECT
-                b.borough_name AS borough,
-                round(AVG(l.price), 2) AS AveragePrice,
-                COUNT(l.listing_id) AS NumberOfProperties
-            FROM
-                listings l
-            JOIN
-                locations loc ON l.listing_id = loc.listing_id
-            JOIN
-                borough b ON loc.borough_id = b.borough_id
-            WHERE
-                l.price IS NOT NULL
-                AND l.price > 0
-            """
-
-            # 添加篩選條件（如果有選擇）
-            if selected_boroughs:
-                borough_list = "', '".join(selected_boroughs)
-                query += f" AND b.borough_name IN ('{borough_list}')"
-            else:
-                query += " AND b.borough_name IN ('Bronx', 'Brooklyn', 'Manhattan', 'Queens', 'Staten Island')"
-
-            query += " GROUP BY b.borough_name;"
-
-            # 執行查詢並讀取資料
-            df = pd.read_sql_query(query, conn)
+        if dataset.IN_MEMORY_DATASET:
+            # 以記憶體中的資料集向量化計算
+            df = dataset.get_dataset().price_summary(selected_boroughs)
+        else:
+            # 執行查詢並讀取資料（共用唯讀連線池，行政區以綁定參數傳入）
+            df = db.read_sql_query(PRICE_QUERY, db.borough_params(selected_boroughs), name='price')
 
         # 自定義行政區域顏色
         borough_colors = {
@@ -65,7 +54,7 @@ def create_price_figure(selected_boroughs=None):
         fig.add_trace(go.Bar(
             x=df['borough'],
             y=df['NumberOfProperties'],
-            marker_color=[borough_colors[borough] for borough in df['borough']],
+            marker_color=df['borough'].map(borough_colors).to_numpy(),
             name='Number of Properties',
             yaxis='y',
             showlegend=False,
@@ -118,20 +107,26 @@ def create_price_figure(selected_boroughs=None):
         return fig
 
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"Error creating price figure: {e}")
-        fig = go.Figure()
-        fig.update_layout(
-            title="Error Loading Price Data",
-            annotations=[{
-                "text": "Error loading price data. Please check database connection.",
-                "xref": "paper",
-                "yref": "paper",
-                "showarrow": False,
-                "font": {"size": 14}
-            }]
-        )
-        return fig
-
+        return create_price_error_figure()
+
+
+def create_price_error_figure():
+    """價格資料無法載入時顯示的圖表"""
+    fig = go.Figure()
+    fig.update_layout(
+        title="Error Loading Price Data",
+        annotations=[{
+            "text": "Error loading price data. Please check database connection.",
+            "xref": "paper",
+            "yref": "paper",
+            "showarrow": False,
+            "font": {"size": 14}
+        }]
+    )
+    return fig
 
 
 # 測試用主程式
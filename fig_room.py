@@ -1,52 +1,116 @@
 import dash
 from dash import dcc, html
 from dash.dependencies import Input, Output
+import numpy as np
 import pandas as pd
 import plotly.express as px
-import sqlite3
+import plotly.graph_objects as go
 import os
+import db
+import dataset
 
-def create_room_figure(selected_boroughs=None, y_range=None):
-    """創建房型分析箱型圖"""
+
+# 預設在伺服器端計算箱型圖統計量，只傳送四分位數與少量離群值
+ROOM_BOX_SUMMARY = os.environ.get('ROOM_BOX_SUMMARY', '1') == '1'
+
+# 每種房型保留的離群值數量上限（保留 hover 資訊）
+ROOM_BOX_MAX_OUTLIERS = int(os.environ.get('ROOM_BOX_MAX_OUTLIERS', '50'))
+
+# 離群值與完整資料模式共用的 hover 格式
+LISTING_HOVERTEMPLATE = (
+    "<b>%{x}</b><br>" +
+    "Price: $%{y:,.2f}<br>" +
+    "Host: %{customdata[1]}<br>" +
+    "Listing ID: %{customdata[0]}" +
+    "<extra></extra>"
+)
+
+# create_room_figure 回報進度的步驟數（讀取資料、建立箱型圖、設定版面）
+ROOM_FIGURE_STEPS = 3
+
+
+# 各房源房型與價格（行政區以綁定參數篩選）
+ROOM_QUERY = f"""
+SELECT
+    b.borough_name AS borough,
+    l.listing_id,
+    h.host_name,
+    l.room_type,
+    l.price
+FROM
+    listings l
+JOIN
+    locations loc ON l.listing_id = loc.listing_id
+JOIN
+    borough b ON loc.borough_id = b.borough_id
+JOIN
+    hosts h ON l.host_id = h.host_id
+WHERE
+    l.price > 0
+    AND l.price < 2000
+    AND {db.BOROUGH_FILTER}
+"""
+
+
+def compute_box_stats(df, max_outliers=ROOM_BOX_MAX_OUTLIERS):
+    """計算各房型的四分位數、鬚線、平均值，以及離群值中距中位數最遠的前 N 筆
+
+    四分位數、鬚線與離群值的定義和 Plotly.js 預設（quartilemethod='linear'）相同：
+    四分位數以 n*p - 0.5 的位置內插（NumPy 的 hazen），鬚線為 1.5 倍 IQR 範圍內的最小 / 最大值。
+    回傳 (stats DataFrame, outliers DataFrame)。
+    """
+    grouped = df.groupby('room_type', observed=True)['price']
+    stats = pd.DataFrame.from_dict(
+        {
+            room_type: np.quantile(prices.to_numpy(dtype=np.float64), [0.25, 0.5, 0.75], method='hazen')
+            for room_type, prices in grouped
+        },
+        orient='index',
+        columns=['q1', 'median', 'q3']
+    )
+    stats.index.name = 'room_type'
+    stats['mean'] = grouped.mean()
+    stats['total'] = grouped.sum()
+
+    iqr = stats['q3'] - stats['q1']
+    lower_limit = df['room_type'].map(stats['q1'] - 1.5 * iqr)
+    upper_limit = df['room_type'].map(stats['q3'] + 1.5 * iqr)
+    inside = (df['price'] >= lower_limit) & (df['price'] <= upper_limit)
+
+    stats['lowerfence'] = df['price'].where(inside).groupby(df['room_type'], observed=True).min()
+    stats['upperfence'] = df['price'].where(inside).groupby(df['room_type'], observed=True).max()
+    # Plotly.js 的鬚線不會縮進箱子內
+    stats['lowerfence'] = np.minimum(stats['lowerfence'], stats['q1'])
+    stats['upperfence'] = np.maximum(stats['upperfence'], stats['q3'])
+
+    # 離群值依距離中位數排序，每種房型只留前 N 筆
+    outliers = df[~inside].copy()
+    outliers['distance'] = (outliers['price'] - outliers['room_type'].map(stats['median'])).abs()
+    outliers = (
+        outliers.sort_values('distance', ascending=False)
+        .groupby('room_type', observed=True)
+        .head(max_outliers)
+    )
+
+    return stats.reset_index(), outliers
+
+
+def create_room_figure(selected_boroughs=None, y_range=None, summary=None, progress=None, raise_errors=False):
+    """創建房型分析箱型圖（summary 為 True 時只傳送伺服器端算好的統計量）
+
+    progress 為選填的 progress(完成步驟, ROOM_FIGURE_STEPS) 函式，供 background callback 顯示進度。
+    raise_errors 為 True 時不改回傳錯誤圖表，例外交給呼叫端。
+    """
+    if summary is None:
+        summary = ROOM_BOX_SUMMARY
+    if progress is None:
+        progress = lambda step, total: None
     try:
-        # 獲取資料庫路徑
-        # if os.environ.get('ENV') == 'production':
-        #     db_path = os.environ.get('DATABASE_URL')  # Heroku 環境使用 DATABASE_URL
-        # else:
-        #     current_dir = os.path.dirname(os.path.abspath(__file__))
-        #     db_path = os.path.join(current_dir, 'db_final.db')  # 本地開發環境使用 SQLite
-
-        db_path = 'db_final.sqlite3'
-
-        # 建立資料庫連線
-        with sqlite3.connect(db_path) as conn:
-            # 基本查詢
-            query = """
-            SELECT
-                b.borough_name AS borough,
-                l.listing_id,
-                h.host_name,
-                l.room_type,
-                l.price
-            FROM
-                listings l
-            JOIN
-                locations loc ON l.listing_id = loc.listing_id
-            JOIN
-                borough b ON loc.borough_id = b.borough_id
-            JOIN
-                hosts h ON l.host_id = h.host_id
-            WHERE
-                l.price > 0
-                AND l.price < 2000
-            """
-
-            # 添加行政區篩選條件（如果有選擇）
-            if selected_boroughs:
-                borough_list = "', '".join(selected_boroughs)
-                query += f" AND b.borough_name IN ('{borough_list}')"
-
-            df = pd.read_sql_query(query, conn)
+        if dataset.IN_MEMORY_DATASET:
+            # 以記憶體中的資料集向量化篩選
+            df = dataset.get_dataset().room_listings(selected_boroughs)
+        else:
+            df = db.read_sql_query(ROOM_QUERY, db.borough_params(selected_boroughs), name='room')
 
         # 過濾和重命名房型類型
         room_type_mapping = {
@@ -57,6 +121,7 @@ def create_room_figure(selected_boroughs=None, y_range=None):
         }
         df = df[df["room_type"].isin(room_type_mapping.keys())]
         df["room_type"] = df["room_type"].map(room_type_mapping)
+        progress(1, ROOM_FIGURE_STEPS)
 
         # 自定義色票（還原您的原始配色）
         custom_colors = {
@@ -66,20 +131,11 @@ def create_room_figure(selected_boroughs=None, y_range=None):
             "Shared Room": "#9c9c7c"
         }
 
-        # 創建箱型圖
-        fig = px.box(
-            df,
-            x="room_type",
-            y="price",
-            title="Price Distribution by Room Type",
-            labels={
-                "room_type": "Room Type",
-                "price": "Price per Night ($)"
-            },
-            color="room_type",
-            color_discrete_map=custom_colors,
-            hover_data=["listing_id", "host_name"]
-        )
+        if summary:
+            fig = create_summary_box(df, custom_colors)
+        else:
+            fig = create_full_box(df, custom_colors)
+        progress(2, ROOM_FIGURE_STEPS)
 
         # 設定 y 軸範圍
         y_axis_range = y_range if y_range else [0, min(2000, df['price'].quantile(0.95))]
@@ -96,8 +152,7 @@ def create_room_figure(selected_boroughs=None, y_range=None):
             ),
             xaxis=dict(
                 title=dict(text="Room Type", font=dict(size=14)),
-                tickfont=dict(size=12),
-                categoryorder="total ascending"
+                tickfont=dict(size=12)
             ),
             title=dict(
                 text="Room Type Price Distribution",
@@ -110,33 +165,96 @@ def create_room_figure(selected_boroughs=None, y_range=None):
             margin=dict(t=50, b=80, l=50, r=50),
             hovermode="closest"
         )
-
-        # 更新箱型圖的 hover 效果
-        fig.update_traces(
-            boxmean=True,  # 顯示平均值
-            hovertemplate=(
-                "<b>%{x}</b><br>" +
-                "Price: $%{y:,.2f}<br>" +
-                "Host: %{customdata[1]}<br>" +
-                "Listing ID: %{customdata[0]}" +
-                "<extra></extra>"
-            )
-        )
+        progress(3, ROOM_FIGURE_STEPS)
 
         return fig
 
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"Error creating room figure: {e}")
-        return px.box(
-            pd.DataFrame({'x': [], 'y': []}),
-            title="Error Loading Data"
-        ).add_annotation(
-            text="Error loading data. Please check database connection.",
-            xref="paper",
-            yref="paper",
-            showarrow=False,
-            font=dict(size=14)
-        )
+        return create_room_error_figure()
+
+
+def create_room_error_figure():
+    """房型資料無法載入時顯示的圖表"""
+    return px.box(
+        pd.DataFrame({'x': [], 'y': []}),
+        title="Error Loading Data"
+    ).add_annotation(
+        text="Error loading data. Please check database connection.",
+        xref="paper",
+        yref="paper",
+        showarrow=False,
+        font=dict(size=14)
+    )
+
+
+def create_summary_box(df, custom_colors):
+    """以伺服器端統計量建立箱型圖，只附上前 N 筆離群值"""
+    stats, outliers = compute_box_stats(df)
+
+    fig = go.Figure()
+    for row in stats.itertuples(index=False):
+        fig.add_trace(go.Box(
+            x=[row.room_type],
+            q1=[row.q1],
+            median=[row.median],
+            q3=[row.q3],
+            lowerfence=[row.lowerfence],
+            upperfence=[row.upperfence],
+            mean=[row.mean],
+            boxmean=True,  # 顯示平均值
+            boxpoints=False,
+            name=row.room_type,
+            marker_color=custom_colors[row.room_type]
+        ))
+
+    # 離群值另以散佈點呈現，保留房源與房東資訊
+    fig.add_trace(go.Scatter(
+        x=outliers['room_type'],
+        y=outliers['price'],
+        mode='markers',
+        marker=dict(color="#9c9c7c", size=4, opacity=0.6),
+        customdata=outliers[['listing_id', 'host_name']].to_numpy(),
+        hovertemplate=LISTING_HOVERTEMPLATE,
+        name='Outliers'
+    ))
+
+    # 預先計算的箱型圖沒有原始資料，依價格總和自行排序房型（等同 total ascending）
+    fig.update_xaxes(
+        categoryorder="array",
+        categoryarray=list(stats.sort_values('total')['room_type'])
+    )
+    return fig
+
+
+def create_full_box(df, custom_colors):
+    """以全部房源建立箱型圖（由瀏覽器計算四分位數）"""
+    # 創建箱型圖
+    fig = px.box(
+        df,
+        x="room_type",
+        y="price",
+        title="Price Distribution by Room Type",
+        labels={
+            "room_type": "Room Type",
+            "price": "Price per Night ($)"
+        },
+        color="room_type",
+        color_discrete_map=custom_colors,
+        hover_data=["listing_id", "host_name"]
+    )
+    fig.update_xaxes(categoryorder="total ascending")
+
+    # 更新箱型圖的 hover 效果
+    fig.update_traces(
+        boxmean=True,  # 顯示平均值
+        hovertemplate=LISTING_HOVERTEMPLATE
+    )
+
+    return fig
+
 
 # 測試用主程式
 if __name__ == "__main__":
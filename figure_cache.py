@@ -0,0 +1,228 @@
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import figure_json
+import metrics
+from fig_price import create_price_figure, create_price_error_figure
+from fig_room import create_room_figure, create_room_error_figure
+from fig_neighborhood import create_neighborhood_figure, create_neighborhood_error_figure
+
+
+BOROUGHS = ["Bronx", "Brooklyn", "Manhattan", "Queens", "Staten Island"]
+
+# 快取大小與存活時間（秒），可用環境變數調整
+FIGURE_CACHE_SIZE = int(os.environ.get('FIGURE_CACHE_SIZE', '128'))
+FIGURE_CACHE_TTL = float(os.environ.get('FIGURE_CACHE_TTL', '3600'))
+
+# 並行建立圖表的執行緒數量（0 為在 callback 執行緒內依序建立）與每次更新的逾時秒數。
+# 單核心主機上執行緒池只增加切換成本（benchmark.py 的 callbacks_pool 比 callbacks_serial 慢），
+# 預設只在多核心主機上使用 2 個執行緒
+_CPU_COUNT = os.cpu_count() or 1
+FIGURE_WORKERS = int(os.environ.get('FIGURE_WORKERS', '2' if _CPU_COUNT > 1 else '0'))
+FIGURE_TIMEOUT = float(os.environ.get('FIGURE_TIMEOUT', '10'))
+
+
+def normalize_selection(selected_boroughs):
+    """將行政區選擇轉成與順序無關的 key（未選擇時為空 tuple）"""
+    return tuple(sorted(set(selected_boroughs or [])))
+
+
+def all_selections():
+    """所有 2^5 = 32 種行政區組合（包含未選擇）"""
+    return [
+        combo
+        for size in range(len(BOROUGHS) + 1)
+        for combo in itertools.combinations(BOROUGHS, size)
+    ]
+
+
+class FigureCache:
+    """以 LRU + TTL 淘汰的圖表快取，存放序列化後的 figure JSON"""
+
+    def __init__(self, maxsize=FIGURE_CACHE_SIZE, ttl=FIGURE_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created, payload = entry
+                if time.monotonic() - created <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return payload
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def _store(self, key, payload):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, key):
+        """key 是否有尚未過期的快取（不計入命中次數）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and time.monotonic() - entry[0] <= self.ttl
+
+    def get_json(self, key, builder):
+        """取得 key 對應的 figure JSON，沒有快取時呼叫 builder 建立
+
+        builder 發生例外時不寫入快取，例外交給呼叫端（改顯示錯誤圖表，下次再重新建立）。
+        """
+        payload = self._lookup(key)
+        if payload is None:
+            with metrics.timer(metrics.FIGURE_BUILD_SECONDS, key[0]):
+                payload = figure_json.to_json(builder())
+            self._store(key, payload)
+        return payload
+
+    def get(self, key, builder):
+        """取得 key 對應的 figure（dict，可直接作為 dcc.Graph 的 figure）"""
+        return figure_json.loads(self.get_json(key, builder))
+
+    def stats(self):
+        """命中 / 未命中次數與目前項目數"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'maxsize': self.maxsize
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+cache = FigureCache()
+
+metrics.register_gauge('dashboard_figure_cache_hits_total', 'Figure cache hits', 'counter',
+                       lambda: cache.stats()['hits'])
+metrics.register_gauge('dashboard_figure_cache_misses_total', 'Figure cache misses', 'counter',
+                       lambda: cache.stats()['misses'])
+metrics.register_gauge('dashboard_figure_cache_entries', 'Figures currently cached', 'gauge',
+                       lambda: cache.stats()['size'])
+
+
+def price_key(selected_boroughs=None):
+    return ('price', normalize_selection(selected_boroughs))
+
+
+def room_key(selected_boroughs=None, y_range=None):
+    return ('room', normalize_selection(selected_boroughs), tuple(y_range) if y_range else None)
+
+
+def price_figure(selected_boroughs=None):
+    """快取版的 create_price_figure（查詢失敗時拋出例外，不快取錯誤圖表）"""
+    key = price_key(selected_boroughs)
+    return cache.get(key, lambda: create_price_figure(list(key[1]), raise_errors=True))
+
+
+def room_figure(selected_boroughs=None, y_range=None):
+    """快取版的 create_room_figure（查詢失敗時拋出例外，不快取錯誤圖表）"""
+    key = room_key(selected_boroughs, y_range)
+    return cache.get(
+        key,
+        lambda: create_room_figure(list(key[1]), y_range=list(key[2]) if key[2] else None, raise_errors=True)
+    )
+
+
+def neighborhood_key(borough=None):
+    return ('neighborhood', borough or None)
+
+
+def neighborhood_figure(borough=None):
+    """快取版的 create_neighborhood_figure（每個行政區一張，未選擇時為提示圖；查詢失敗時拋出例外）"""
+    key = neighborhood_key(borough)
+    return cache.get(key, lambda: create_neighborhood_figure(key[1], raise_errors=True))
+
+
+def warm_up():
+    """預先建立所有行政區組合的價格圖與房型圖，以及各行政區的街區圖"""
+    try:
+        for selection in all_selections():
+            price_figure(selection)
+            room_figure(selection)
+        for borough in [None] + BOROUGHS:
+            neighborhood_figure(borough)
+    except Exception as e:
+        # 預熱失敗不影響啟動，之後的點擊會再嘗試建立
+        print(f"Error warming up figure cache: {e}")
+
+
+_executor = None
+_executor_workers = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """延遲建立執行緒池，gunicorn fork 出 worker 之後才會產生執行緒（FIGURE_WORKERS 改變時重建）"""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != FIGURE_WORKERS:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ThreadPoolExecutor(max_workers=FIGURE_WORKERS, thread_name_prefix='figure')
+            _executor_workers = FIGURE_WORKERS
+        return _executor
+
+
+def build_concurrently(tasks, timeout=None, inline=False):
+    """在執行緒池中同時執行互不相依的圖表工作
+
+    tasks 為 {名稱: (工作函式, 失敗時的備用圖表函式)}。所有工作共用同一個期限，
+    逾時或發生例外時改用備用圖表（逾時的工作仍會在背景完成並寫入快取）。
+    inline 為 True 時（例如圖表都已快取）直接在目前執行緒依序執行，省去切換執行緒的成本。
+    回傳 {名稱: (結果, 是否成功)}。
+    """
+    timeout = FIGURE_TIMEOUT if timeout is None else timeout
+
+    if inline or FIGURE_WORKERS <= 0:
+        results = {}
+        for name, (task, fallback) in tasks.items():
+            try:
+                results[name] = (task(), True)
+            except Exception as e:
+                print(f"Error building {name} figure: {e}")
+                results[name] = (fallback(), False)
+        return results
+
+    executor = _get_executor()
+    futures = {name: executor.submit(task) for name, (task, _) in tasks.items()}
+    deadline = time.monotonic() + timeout
+    results = {}
+    for name, future in futures.items():
+        try:
+            results[name] = (future.result(timeout=max(0, deadline - time.monotonic())), True)
+        except FutureTimeoutError:
+            print(f"Timed out building {name} figure after {timeout:.1f}s")
+            results[name] = (tasks[name][1](), False)
+        except Exception as e:
+            print(f"Error building {name} figure: {e}")
+            results[name] = (tasks[name][1](), False)
+    return results
+
+
+# build_concurrently 使用的備用圖表
+FALLBACK_FIGURES = {
+    'price': create_price_error_figure,
+    'room': create_room_error_figure,
+    'neighborhood': create_neighborhood_error_figure,
+}
@@ -0,0 +1,84 @@
+import datetime
+import json
+
+import numpy as np
+import plotly.io as pio
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(obj):
+    """orjson 無法直接處理的型別（字串等 object 陣列、NumPy 純量、日期）"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (datetime.date, datetime.datetime)):
+        return obj.isoformat()
+    if hasattr(obj, 'to_plotly_json'):
+        return obj.to_plotly_json()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def to_json(fig):
+    """把 figure 序列化成 JSON 字串
+
+    trace 資料維持 NumPy 陣列，由 orjson 直接以 C 編碼數值陣列，不逐一轉成 Python 物件；
+    未安裝 orjson 時改用 Plotly 內建的 json 編碼。
+    """
+    if orjson is None:
+        return pio.to_json(fig, validate=False, engine='json')
+    data = fig.to_plotly_json() if hasattr(fig, 'to_plotly_json') else fig
+    return orjson.dumps(data, default=_default, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+
+def loads(payload):
+    """解析 figure JSON 字串"""
+    if orjson is None:
+        return json.loads(payload)
+    return orjson.loads(payload)
+
+
+def _is_numeric(values):
+    """巢狀列表的元素是否全為數值或 None（不含布林值）"""
+    for value in values:
+        if isinstance(value, list):
+            if not _is_numeric(value):
+                return False
+        elif value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            return False
+    return True
+
+
+def _to_arrays(obj):
+    if isinstance(obj, dict):
+        return {k: _to_arrays(v) for k, v in obj.items()}
+    if isinstance(obj, list) and obj:
+        if _is_numeric(obj):
+            try:
+                array = np.asarray(obj)
+                if array.dtype.kind == 'O':
+                    # 含 None 的數值列表，None 轉成 NaN（序列化時仍輸出為 null）
+                    array = np.asarray(obj, dtype=np.float64)
+                return array
+            except ValueError:
+                # 長度不一的巢狀列表
+                return obj
+        return [_to_arrays(v) for v in obj]
+    return obj
+
+
+def with_arrays(figure):
+    """把 figure dict 中 trace 的數值列表轉回 NumPy 陣列
+
+    Dash 每次回應都會以 Plotly 的 JSON 編碼器逐一檢查列表元素；數值陣列則可直接交給 orjson，
+    適合常駐記憶體、每次載入頁面都要序列化的圖表（例如網格熱度圖）。
+    """
+    if orjson is None:
+        return figure
+    figure = dict(figure)
+    figure['data'] = [_to_arrays(trace) for trace in figure.get('data', [])]
+    return figure
@@ -0,0 +1,43 @@
+import json
+
+from dash import Patch
+from plotly.utils import PlotlyJSONEncoder
+
+
+def _diff(patch, old, new):
+    """把 old -> new 的差異寫入 patch（只更新有變動的欄位）"""
+    for key, value in new.items():
+        if key not in old:
+            patch[key] = value
+        elif old[key] != value:
+            if isinstance(value, dict) and isinstance(old[key], dict):
+                _diff(patch[key], old[key], value)
+            elif (
+                isinstance(value, list) and isinstance(old[key], list)
+                and len(value) == len(old[key])
+                and all(isinstance(item, dict) for item in value + old[key])
+            ):
+                # trace 數量相同時逐一比較，只送出變動的屬性
+                for index, (old_item, new_item) in enumerate(zip(old[key], value)):
+                    if old_item != new_item:
+                        _diff(patch[key][index], old_item, new_item)
+            else:
+                patch[key] = value
+
+    for key in old:
+        if key not in new:
+            del patch[key]
+
+
+def diff_figure(old_figure, new_figure):
+    """比較兩個 figure dict，回傳只包含差異的 dash.Patch"""
+    patch = Patch()
+    _diff(patch, old_figure, new_figure)
+    return patch
+
+
+def payload_size(value):
+    """回傳 callback 輸出（figure 或 Patch）序列化後的位元組數"""
+    if isinstance(value, Patch):
+        value = value.to_plotly_json()
+    return len(json.dumps(value, cls=PlotlyJSONEncoder).encode())
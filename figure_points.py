@@ -0,0 +1,127 @@
+import os
+
+import numpy as np
+import plotly.graph_objects as go
+
+
+# 點數超過此值時先降採樣，降採樣後仍超過則改用 WebGL（Scattergl）繪製
+SCATTERGL_THRESHOLD = int(os.environ.get('SCATTERGL_THRESHOLD', '2000'))
+
+# 散佈點降採樣的像素格大小：同一格內的點在畫面上幾乎重疊，只保留一個
+DECIMATION_CELL_PX = int(os.environ.get('DECIMATION_CELL_PX', '2'))
+
+# 瀏覽器未回報繪圖區大小時使用的像素（寬, 高）
+DEFAULT_PLOT_SIZE = (1200, 400)
+
+
+def stratified_sample(x, y, x_range, y_range, width_px, height_px, cell_px=DECIMATION_CELL_PX, seed=0):
+    """以像素格分層隨機抽樣，每個 cell_px × cell_px 的像素格最多保留一點
+
+    範圍外或座標為 NaN 的點不保留。回傳保留點的索引（遞增）。
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    cols = max(1, int(width_px // cell_px))
+    rows = max(1, int(height_px // cell_px))
+
+    col = np.floor((x - x_range[0]) / (x_range[1] - x_range[0]) * cols)
+    row = np.floor((y - y_range[0]) / (y_range[1] - y_range[0]) * rows)
+    # 右 / 上邊界上的點歸入最後一格
+    col[x == x_range[1]] = cols - 1
+    row[y == y_range[1]] = rows - 1
+    # NaN 的比較結果為 False，不會被視為範圍內
+    inside = np.flatnonzero((col >= 0) & (col < cols) & (row >= 0) & (row < rows))
+    cells = row[inside].astype(np.int64) * cols + col[inside].astype(np.int64)
+
+    # 依隨機順序寫入每格的代表點，同一格被多次寫入時只留下其中一個（不需排序，O(n)）
+    order = np.random.default_rng(seed).permutation(len(inside))
+    winner = np.full(rows * cols, -1, dtype=np.int64)
+    winner[cells[order]] = inside[order]
+    return np.sort(winner[winner >= 0])
+
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets：把依 x 排序的序列降到 n_out 點並保留形狀，回傳保留點的索引
+
+    首尾兩點固定保留，中間分成 n_out - 2 個區段，每段保留與前一個保留點、
+    下一段平均點構成最大三角形面積的點。
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        area = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+
+def decimate(x, y, x_range=None, y_range=None, width_px=None, height_px=None, ordered=False):
+    """依繪圖區像素大小降採樣，回傳保留點的索引
+
+    ordered 為 True 時（x 已遞增，例如時間序列）使用 LTTB，每個像素寬保留 2 點；
+    其他散佈點以像素格分層隨機抽樣。x_range / y_range 未提供時以資料範圍計算。
+    """
+    width_px = width_px or DEFAULT_PLOT_SIZE[0]
+    height_px = height_px or DEFAULT_PLOT_SIZE[1]
+    if ordered:
+        return lttb(x, y, 2 * int(width_px))
+
+    if x_range is None:
+        x_range = (np.nanmin(x), np.nanmax(x))
+    if y_range is None:
+        y_range = (np.nanmin(y), np.nanmax(y))
+    if x_range[0] == x_range[1] or y_range[0] == y_range[1]:
+        return np.arange(len(x))
+    return stratified_sample(x, y, x_range, y_range, width_px, height_px)
+
+
+def decimate_points(x, y, customdata=None, x_range=None, y_range=None, width_px=None, height_px=None,
+                    ordered=False):
+    """點數超過 SCATTERGL_THRESHOLD 時依繪圖區像素大小降採樣
+
+    回傳 (trace 類型, x, y, customdata)：降採樣後仍超過門檻為 'scattergl'，否則為 'scatter'。
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if customdata is not None:
+        customdata = np.asarray(customdata)
+
+    if len(x) > SCATTERGL_THRESHOLD:
+        index = decimate(x, y, x_range, y_range, width_px, height_px, ordered)
+        x, y = x[index], y[index]
+        if customdata is not None:
+            customdata = customdata[index]
+
+    trace_type = 'scattergl' if len(x) > SCATTERGL_THRESHOLD else 'scatter'
+    return trace_type, x, y, customdata
+
+
+def point_trace(x, y, customdata=None, x_range=None, y_range=None, width_px=None, height_px=None,
+                ordered=False, **kwargs):
+    """建立散佈點 trace，點多時自動降採樣並改用 WebGL
+
+    點數不超過 SCATTERGL_THRESHOLD 時原樣以 SVG 的 go.Scatter 繪製；
+    超過時依繪圖區像素大小降採樣，降採樣後仍超過門檻則使用 go.Scattergl。
+    其餘參數（mode、marker、hovertemplate 等）直接傳給 trace。
+    """
+    trace_type, x, y, customdata = decimate_points(
+        x, y, customdata, x_range, y_range, width_px, height_px, ordered
+    )
+    trace_class = go.Scattergl if trace_type == 'scattergl' else go.Scatter
+    return trace_class(x=x, y=y, customdata=customdata, **kwargs)
@@ -0,0 +1,160 @@
+import argparse
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import db
+import migrate
+
+
+# 每批寫入的筆數
+CHUNK_SIZE = 200_000
+
+# 合成資料的價格與座標抖動幅度
+PRICE_JITTER = 0.15
+COORDINATE_JITTER = 0.002
+
+SOURCE_QUERY = """
+SELECT
+    l.listing_id,
+    l.host_id,
+    l.room_type,
+    l.price,
+    l.minimum_nights,
+    l.availability_365,
+    l.bedrooms,
+    l.beds,
+    l.baths,
+    l.rating,
+    loc.borough,
+    loc.borough_id,
+    loc.latitude,
+    loc.longitude
+FROM
+    listings l
+JOIN
+    locations loc ON l.listing_id = loc.listing_id
+"""
+
+LISTING_COLUMNS = [
+    'listing_id', 'host_id', 'room_type', 'price', 'minimum_nights',
+    'availability_365', 'bedrooms', 'beds', 'baths', 'rating'
+]
+LOCATION_COLUMNS = ['location_id', 'borough', 'borough_id', 'latitude', 'longitude', 'listing_id']
+
+
+def _copy_schema(source, target):
+    """把來源資料庫的資料表結構複製到新資料庫
+
+    虛擬資料表（例如 R*Tree）與其內部資料表不複製，由 migration 在新資料庫重建。
+    """
+    tables = source.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+    ).fetchall()
+    virtual = [name for name, sql in tables if sql.upper().startswith('CREATE VIRTUAL TABLE')]
+    for name, sql in tables:
+        if any(name == v or name.startswith(f"{v}_") for v in virtual):
+            continue
+        target.execute(sql)
+
+
+def _rows(df, columns):
+    """把 DataFrame 轉成 executemany 可用的 Python 原生型別列"""
+    return list(df[columns].astype(object).where(df[columns].notna(), None).itertuples(index=False, name=None))
+
+
+def _insert(conn, table, columns, rows):
+    placeholders = ", ".join("?" for _ in columns)
+    conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+
+
+def generate(source_path, target_path, scale, seed=0):
+    """以來源資料的分布產生 scale 倍大小的資料庫
+
+    每筆合成房源從原始房源中抽樣（保留行政區、街區、房型與其他欄位的聯合分布），
+    再對價格與座標加上小幅抖動；房東與犯罪事件則依倍數複製並重新編號。
+    """
+    rng = np.random.default_rng(seed)
+    if os.path.exists(target_path):
+        os.remove(target_path)
+
+    source = sqlite3.connect(Path(source_path).resolve().as_uri() + "?mode=ro", uri=True)
+    target = sqlite3.connect(target_path, isolation_level=None)
+    target.execute("PRAGMA journal_mode = OFF")
+    target.execute("PRAGMA synchronous = OFF")
+
+    try:
+        _copy_schema(source, target)
+        target.execute("BEGIN")
+
+        # 行政區維持不變
+        borough = pd.read_sql_query("SELECT * FROM borough", source)
+        _insert(target, 'borough', list(borough.columns), _rows(borough, list(borough.columns)))
+
+        # 房東：每個副本重新編號
+        hosts = pd.read_sql_query("SELECT * FROM hosts", source)
+        host_index = pd.Series(np.arange(len(hosts)), index=hosts['host_id'])
+        for replica in range(scale):
+            chunk = hosts.copy()
+            chunk['host_id'] = np.arange(len(hosts)) + replica * len(hosts) + 1
+            _insert(target, 'hosts', list(hosts.columns), _rows(chunk, list(hosts.columns)))
+
+        # 犯罪事件：依倍數複製
+        security = pd.read_sql_query("SELECT * FROM security", source)
+        for replica in range(scale):
+            chunk = security.copy()
+            chunk['Event_id'] = np.arange(len(security)) + replica * len(security) + 1
+            _insert(target, 'security', list(security.columns), _rows(chunk, list(security.columns)))
+
+        # 房源與位置：分批抽樣產生
+        listings = pd.read_sql_query(SOURCE_QUERY, source)
+        source_host = host_index.reindex(listings['host_id']).fillna(0).to_numpy(dtype=np.int64)
+        total = len(listings) * scale
+
+        for start in range(0, total, CHUNK_SIZE):
+            size = min(CHUNK_SIZE, total - start)
+            picks = rng.integers(0, len(listings), size)
+            chunk = listings.iloc[picks].reset_index(drop=True)
+
+            ids = np.arange(start, start + size) + 1
+            chunk['listing_id'] = ids
+            chunk['location_id'] = ids
+            chunk['host_id'] = source_host[picks] + rng.integers(0, scale, size) * len(hosts) + 1
+            chunk['price'] = np.maximum(
+                10, np.round(chunk['price'] * rng.lognormal(0, PRICE_JITTER, size))
+            ).astype(np.int64)
+            chunk['latitude'] = chunk['latitude'] + rng.normal(0, COORDINATE_JITTER, size)
+            chunk['longitude'] = chunk['longitude'] + rng.normal(0, COORDINATE_JITTER, size)
+
+            _insert(target, 'listings', LISTING_COLUMNS, _rows(chunk, LISTING_COLUMNS))
+            _insert(target, 'locations', LOCATION_COLUMNS, _rows(chunk, LOCATION_COLUMNS))
+
+        target.execute("COMMIT")
+    finally:
+        source.close()
+        target.close()
+
+    # 建立索引與統計資料
+    migrate.upgrade(target_path)
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="產生放大倍數的合成資料庫，供壓力測試使用")
+    parser.add_argument("--scale", type=int, action="append",
+                        help="放大倍數（可重複指定，例如 --scale 10 --scale 100，預設 10）")
+    parser.add_argument("--source", default=db.DB_PATH, help="來源資料庫")
+    parser.add_argument("--out-dir", default=os.path.dirname(os.path.abspath(db.DB_PATH)),
+                        help="輸出目錄（檔名為 db_x<倍數>.sqlite3）")
+    parser.add_argument("--seed", type=int, default=0, help="亂數種子")
+    args = parser.parse_args()
+
+    for scale in args.scale or [10]:
+        target_path = os.path.join(args.out_dir, f"db_x{scale}.sqlite3")
+        start = time.perf_counter()
+        total = generate(args.source, target_path, scale, args.seed)
+        print(f"{target_path}: {total:,} listings in {time.perf_counter() - start:.1f}s")
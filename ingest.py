@@ -0,0 +1,275 @@
+import argparse
+import csv
+import itertools
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+import db
+import migrate
+import snapshot
+
+
+# CSV 資料夾（可用環境變數 DATA_DIR 覆寫，預設為專案內的 data/）
+DATA_DIR = os.environ.get(
+    'DATA_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+)
+
+# 每批 executemany 的筆數
+CHUNK_SIZE = int(os.environ.get('INGEST_CHUNK_SIZE', '50000'))
+
+# 依外鍵順序載入：(資料表, 主鍵, 建表語法)
+TABLES = [
+    ("borough", "borough_id", """
+        CREATE TABLE IF NOT EXISTS "borough" (
+            "borough_id"	INTEGER,
+            "borough_name"	TEXT,
+            "tourist_revenue"	INTEGER,
+            PRIMARY KEY("borough_id")
+        )"""),
+    ("hosts", "host_id", """
+        CREATE TABLE IF NOT EXISTS "hosts" (
+            "host_id"	INTEGER,
+            "host_name"	TEXT,
+            "host_listings_count"	INTEGER,
+            "license"	TEXT,
+            PRIMARY KEY("host_id")
+        )"""),
+    ("listings", "listing_id", """
+        CREATE TABLE IF NOT EXISTS "listings" (
+            "listing_id"	INTEGER,
+            "host_id"	INTEGER,
+            "room_type"	TEXT,
+            "price"	INTEGER,
+            "minimum_nights"	INTEGER,
+            "availability_365"	INTEGER,
+            "bedrooms"	TEXT,
+            "beds"	INTEGER,
+            "baths"	TEXT,
+            "rating"	TEXT,
+            PRIMARY KEY("listing_id"),
+            FOREIGN KEY("host_id") REFERENCES "hosts"("host_id")
+        )"""),
+    ("locations", "location_id", """
+        CREATE TABLE IF NOT EXISTS "locations" (
+            "location_id"	INTEGER,
+            "borough"	TEXT,
+            "borough_id"	INTEGER,
+            "latitude"	REAL,
+            "longitude"	REAL,
+            "listing_id"	INTEGER,
+            PRIMARY KEY("location_id"),
+            FOREIGN KEY("borough_id") REFERENCES "borough"("borough_id"),
+            FOREIGN KEY("listing_id") REFERENCES "listings"("listing_id")
+        )"""),
+    ("security", "Event_id", """
+        CREATE TABLE IF NOT EXISTS "security" (
+            "Event_id"	INTEGER,
+            "borough_id"	INTEGER,
+            "crime_level"	TEXT,
+            "crime_level_weight"	INTEGER,
+            PRIMARY KEY("Event_id"),
+            FOREIGN KEY("borough_id") REFERENCES "borough"("borough_id")
+        )"""),
+]
+
+
+def upsert_statement(table, key, columns):
+    """只在欄位值有變動時才更新既有資料列的 UPSERT 語法"""
+    values = [c for c in columns if c != key]
+    assignments = ", ".join(f'"{c}" = excluded."{c}"' for c in values)
+    changed = " OR ".join(f'"{table}"."{c}" IS NOT excluded."{c}"' for c in values)
+    quoted = ", ".join(f'"{c}"' for c in columns)
+    return (
+        f'INSERT INTO "{table}" ({quoted}) '
+        f'VALUES ({", ".join("?" for _ in columns)}) '
+        f'ON CONFLICT("{key}") DO UPDATE SET {assignments} WHERE {changed}'
+    )
+
+
+def _parse(value, column_type):
+    """CSV 字串轉成欄位值；空字串視為 NULL
+
+    REAL 欄位以 Python float 轉換（正確捨入），避免 SQLite 文字轉浮點數的最後一位誤差
+    讓未變動的座標被誤判為有變動。
+    """
+    if value == '':
+        return None
+    if column_type == 'REAL':
+        return float(value)
+    return value
+
+
+def read_chunks(path, column_types, chunk_size=CHUNK_SIZE):
+    """逐批讀取 CSV，回傳 (欄位, 批次列表產生器)"""
+    f = open(path, newline='', encoding='utf-8')
+    reader = csv.reader(f)
+    columns = next(reader)
+    types = [column_types.get(c, '') for c in columns]
+
+    def chunks():
+        try:
+            while True:
+                rows = [
+                    tuple(_parse(value, t) for value, t in zip(row, types))
+                    for row in itertools.islice(reader, chunk_size)
+                ]
+                if not rows:
+                    break
+                yield rows
+        finally:
+            f.close()
+
+    return columns, chunks()
+
+
+def _secondary_indexes(conn):
+    """目前的非自動索引：(名稱, 建立語法)"""
+    return conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+    ).fetchall()
+
+
+def _remove_database(path):
+    """刪除資料庫檔及其日誌檔（不存在則略過）"""
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def _working_copy(db_path):
+    """在資料庫旁以 SQLite backup API 建立工作副本（資料庫不存在時為空檔），回傳副本路徑"""
+    work_path = f"{db_path}.{os.getpid()}.ingest"
+    _remove_database(work_path)
+    target = sqlite3.connect(work_path)
+    try:
+        if os.path.exists(db_path):
+            source = sqlite3.connect(Path(db_path).resolve().as_uri() + '?mode=ro', uri=True)
+            try:
+                source.backup(target)
+            finally:
+                source.close()
+    finally:
+        target.close()
+    return work_path
+
+
+def ingest(data_dir=DATA_DIR, db_path=None, chunk_size=CHUNK_SIZE, delete_missing=False):
+    """把 data_dir 內的 CSV 載入資料庫，只寫入新增或變動的資料列
+
+    儀表板以 immutable 唯讀模式開啟資料庫，檔案在讀取中被改寫可能讀到錯誤結果，
+    因此先在資料庫旁建立副本、載入並套用 migration 後，再以 os.replace 整個換掉：
+    執行中的 worker 繼續讀取原本的檔案，重新連線後才看到新資料。
+    回傳 {資料表: 變動列數}。
+    """
+    db_path = db_path or db.DB_PATH
+    work_path = _working_copy(db_path)
+    try:
+        changes = _load_csv(data_dir, work_path, chunk_size, delete_missing)
+        # 新資料庫需要建立索引；既有資料庫則為 no-op
+        migrate.upgrade(work_path)
+        os.replace(work_path, db_path)
+    finally:
+        _remove_database(work_path)
+    return changes
+
+
+def _load_csv(data_dir, db_path, chunk_size, delete_missing):
+    """把 CSV 載入 db_path（工作副本），回傳 {資料表: 變動列數}
+
+    全部資料表在同一個交易內載入；空資料庫載入前先移除次要索引，載入後重建。
+    彙總表（borough_price_stats、neighborhood_price_stats 等）與座標 R*Tree 由觸發器隨每筆變動增量更新。
+    最後更新統計資料，並把日誌模式改回 DELETE（immutable 唯讀模式不能留下 WAL 檔）。
+    """
+    changes = {}
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA cache_size = -262144")
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for _, _, schema in TABLES:
+                conn.execute(schema)
+
+            # 空資料庫大量載入時先移除次要索引，載入後再重建；
+            # 更新既有資料時保留索引，彙總表觸發器要靠它找到對應的資料列
+            bulk_load = all(
+                conn.execute(f'SELECT NOT EXISTS (SELECT 1 FROM "{table}")').fetchone()[0]
+                for table, _, _ in TABLES
+            )
+            indexes = _secondary_indexes(conn) if bulk_load else []
+            for name, _ in indexes:
+                conn.execute(f'DROP INDEX "{name}"')
+
+            for table, key, _ in TABLES:
+                path = os.path.join(data_dir, f"{table}.csv")
+                if not os.path.exists(path):
+                    print(f"Skipping {table}: {path} not found")
+                    continue
+
+                column_types = {
+                    name: column_type.upper()
+                    for _, name, column_type, *_ in conn.execute(f'PRAGMA table_info("{table}")')
+                }
+                columns, chunks = read_chunks(path, column_types, chunk_size)
+                statement = upsert_statement(table, key, columns)
+                key_index = columns.index(key)
+
+                if delete_missing:
+                    conn.execute("CREATE TEMP TABLE IF NOT EXISTS ingest_keys (key PRIMARY KEY) WITHOUT ROWID")
+                    conn.execute("DELETE FROM ingest_keys")
+
+                changed = 0
+                for rows in chunks:
+                    changed += conn.executemany(statement, rows).rowcount
+                    if delete_missing:
+                        conn.executemany("INSERT OR IGNORE INTO ingest_keys VALUES (?)",
+                                         ((row[key_index],) for row in rows))
+
+                # 不在這次 CSV 裡的資料列視為已下架
+                if delete_missing:
+                    changed += conn.execute(
+                        f'DELETE FROM "{table}" WHERE "{key}" NOT IN (SELECT key FROM ingest_keys)'
+                    ).rowcount
+
+                changes[table] = changed
+
+            for _, sql in indexes:
+                conn.execute(sql)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if any(changes.values()):
+            conn.execute("ANALYZE")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        conn.close()
+    return changes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把 data/*.csv 載入或更新 SQLite 資料庫")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="CSV 資料夾")
+    parser.add_argument("--db", default=db.DB_PATH, help="SQLite 資料庫路徑（不存在時會建立）")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="每批寫入筆數")
+    parser.add_argument("--delete-missing", action="store_true",
+                        help="刪除 CSV 中已不存在的資料列")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    changes = ingest(args.data_dir, args.db, args.chunk_size, args.delete_missing)
+    for table, count in changes.items():
+        print(f"{table}: {count:,} rows inserted, updated or deleted")
+    # 已有快照時一併重建，避免 worker 因快照過期而改查 SQLite
+    if snapshot.pa is not None and any(os.path.exists(path) for path in snapshot.snapshot_paths(args.db)):
+        rows, _, _ = snapshot.build_snapshot(args.db)
+        print(f"snapshot: {rows:,} listings")
+    print(f"Done in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,161 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+
+
+# 設為 1 時，每次計時都寫一行 trace log
+TRACE_REQUESTS = os.environ.get('TRACE_REQUESTS', '0') == '1'
+
+# 每組標籤保留最近多少筆樣本來計算百分位數
+METRICS_WINDOW = int(os.environ.get('METRICS_WINDOW', '1024'))
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+logger = logging.getLogger('dashboard.trace')
+if TRACE_REQUESTS:
+    logging.basicConfig(level=logging.INFO)
+
+
+class Summary:
+    """記錄觀測值的總和、次數與最近樣本，輸出 p50 / p95 / p99"""
+
+    def __init__(self, name, help_text, label):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = {
+                    'count': 0,
+                    'sum': 0.0,
+                    'samples': deque(maxlen=METRICS_WINDOW)
+                }
+            series['count'] += 1
+            series['sum'] += value
+            series['samples'].append(value)
+
+    def snapshot(self):
+        """回傳 {標籤值: (count, sum, {quantile: value})}"""
+        with self._lock:
+            return {
+                label_value: (
+                    series['count'],
+                    series['sum'],
+                    dict(zip(QUANTILES, np.quantile(list(series['samples']), QUANTILES)))
+                )
+                for label_value, series in self._series.items()
+            }
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} summary"]
+        for label_value, (count, total, quantiles) in sorted(self.snapshot().items()):
+            label = f'{self.label}="{_escape(label_value)}"'
+            for quantile, value in quantiles.items():
+                lines.append(f'{self.name}{{{label},quantile="{quantile}"}} {value:.6g}')
+            lines.append(f'{self.name}_sum{{{label}}} {total:.6g}')
+            lines.append(f'{self.name}_count{{{label}}} {count}')
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+CALLBACK_SECONDS = Summary(
+    'dashboard_callback_seconds', 'Dash callback latency in seconds', 'callback')
+CALLBACK_RESPONSE_BYTES = Summary(
+    'dashboard_callback_response_bytes', 'Dash callback response size in bytes', 'callback')
+SQL_QUERY_SECONDS = Summary(
+    'dashboard_sql_query_seconds', 'SQLite query latency in seconds', 'query')
+FIGURE_BUILD_SECONDS = Summary(
+    'dashboard_figure_build_seconds', 'Plotly figure build time in seconds', 'figure')
+
+SUMMARIES = [CALLBACK_SECONDS, CALLBACK_RESPONSE_BYTES, SQL_QUERY_SECONDS, FIGURE_BUILD_SECONDS]
+
+# 其他模組註冊的即時數值：(名稱, 說明, 類型, 取值函式)
+_gauges = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def register_gauge(name, help_text, metric_type, getter):
+    """註冊在輸出時才讀取的數值（例如快取命中次數）"""
+    _gauges.append((name, help_text, metric_type, getter))
+
+
+@contextmanager
+def timer(summary, label_value):
+    """計時區塊並記錄到指定的 Summary"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        summary.observe(label_value, elapsed)
+        if TRACE_REQUESTS:
+            logger.info("%s{%s=%s} %.2f ms", summary.name, summary.label, label_value, elapsed * 1000)
+
+
+def timed(summary, label_value):
+    """函式版的 timer 裝飾器"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(summary, label_value):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render():
+    """以 Prometheus text format 輸出所有指標"""
+    lines = []
+    for summary in SUMMARIES:
+        lines.extend(summary.render())
+    for name, help_text, metric_type, getter in _gauges:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.append(f"{name} {getter()}")
+    return "\n".join(lines) + "\n"
+
+
+def init_app(server, callback_names=None):
+    """在 Flask server 上加入 /metrics 路由，並記錄 callback 回應大小
+
+    callback_names 為 {第一個輸出的元件 id: callback 名稱}，用來為回應大小加上標籤。
+    """
+    from flask import Response, request
+
+    callback_names = callback_names or {}
+
+    @server.after_request
+    def record_callback_response(response):
+        if request.path.endswith('/_dash-update-component') and response.content_length is not None:
+            body = request.get_json(silent=True) or {}
+            outputs = body.get('outputs')
+            first_output = outputs[0] if isinstance(outputs, list) and outputs else outputs or {}
+            output_id = first_output.get('id') if isinstance(first_output, dict) else None
+            name = callback_names.get(output_id, str(output_id))
+            CALLBACK_RESPONSE_BYTES.observe(name, response.content_length)
+            if TRACE_REQUESTS:
+                logger.info("callback %s response %d bytes", name, response.content_length)
+        return response
+
+    @server.route('/metrics')
+    def prometheus_metrics():
+        return Response(render(), mimetype='text/plain; version=0.0.4')
+
+    return server
@@ -0,0 +1,336 @@
+import argparse
+import re
+import sqlite3
+import sys
+from pathlib import Path
+
+import db
+
+
+def _price_stats_delta(sign, source):
+    """把 source 子查詢的 (borough_id, room_type, price) 加入或扣出 borough_price_stats"""
+    return f"""
+        INSERT INTO borough_price_stats (borough_id, room_type, listing_count, price_sum)
+        SELECT borough_id, IFNULL(room_type, ''), {sign}1, {sign}price
+        FROM ({source})
+        WHERE price > 0 AND borough_id IS NOT NULL
+        ON CONFLICT(borough_id, room_type) DO UPDATE SET
+            listing_count = listing_count + excluded.listing_count,
+            price_sum = price_sum + excluded.price_sum;"""
+
+
+def _crime_stats_delta(sign, row):
+    """把 security 的一筆資料（NEW 或 OLD）加入或扣出 borough_crime_stats"""
+    return f"""
+        INSERT INTO borough_crime_stats (borough_id, crime_level, event_count, weight_sum)
+        SELECT {row}.borough_id, IFNULL({row}.crime_level, ''), {sign}1, {sign}IFNULL({row}.crime_level_weight, 0)
+        WHERE {row}.borough_id IS NOT NULL
+        ON CONFLICT(borough_id, crime_level) DO UPDATE SET
+            event_count = event_count + excluded.event_count,
+            weight_sum = weight_sum + excluded.weight_sum;"""
+
+
+def _listing_prices(row):
+    return f"SELECT loc.borough_id, {row}.room_type AS room_type, {row}.price AS price " \
+           f"FROM locations loc WHERE loc.listing_id = {row}.listing_id"
+
+
+def _location_prices(row):
+    return f"SELECT {row}.borough_id AS borough_id, l.room_type, l.price " \
+           f"FROM listings l WHERE l.listing_id = {row}.listing_id"
+
+
+# 行政區 × 房型、行政區 × 犯罪等級的彙總表，由觸發器隨資料變動增量更新
+AGGREGATE_TABLES = [
+    """CREATE TABLE IF NOT EXISTS borough_price_stats (
+        borough_id INTEGER NOT NULL,
+        room_type TEXT NOT NULL,
+        listing_count INTEGER NOT NULL,
+        price_sum INTEGER NOT NULL,
+        PRIMARY KEY (borough_id, room_type)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS borough_crime_stats (
+        borough_id INTEGER NOT NULL,
+        crime_level TEXT NOT NULL,
+        event_count INTEGER NOT NULL,
+        weight_sum INTEGER NOT NULL,
+        PRIMARY KEY (borough_id, crime_level)
+    ) WITHOUT ROWID""",
+]
+
+# 從明細表重新計算彙總表（migration 建立時與 ingest 大量載入後使用）
+AGGREGATE_REBUILD = [
+    "DELETE FROM borough_price_stats",
+    """INSERT INTO borough_price_stats (borough_id, room_type, listing_count, price_sum)
+    SELECT loc.borough_id, IFNULL(l.room_type, ''), COUNT(*), SUM(l.price)
+    FROM listings l
+    JOIN locations loc ON l.listing_id = loc.listing_id
+    WHERE l.price > 0 AND loc.borough_id IS NOT NULL
+    GROUP BY loc.borough_id, IFNULL(l.room_type, '')""",
+    "DELETE FROM borough_crime_stats",
+    """INSERT INTO borough_crime_stats (borough_id, crime_level, event_count, weight_sum)
+    SELECT borough_id, IFNULL(crime_level, ''), COUNT(*), SUM(IFNULL(crime_level_weight, 0))
+    FROM security
+    WHERE borough_id IS NOT NULL
+    GROUP BY borough_id, IFNULL(crime_level, '')""",
+]
+
+AGGREGATE_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS trg_listings_insert_stats AFTER INSERT ON listings BEGIN
+        {_price_stats_delta('+', _listing_prices('NEW'))}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_listings_delete_stats AFTER DELETE ON listings BEGIN
+        {_price_stats_delta('-', _listing_prices('OLD'))}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_listings_update_stats
+    AFTER UPDATE OF listing_id, room_type, price ON listings BEGIN
+        {_price_stats_delta('-', _listing_prices('OLD'))}
+        {_price_stats_delta('+', _listing_prices('NEW'))}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_locations_insert_stats AFTER INSERT ON locations BEGIN
+        {_price_stats_delta('+', _location_prices('NEW'))}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_locations_delete_stats AFTER DELETE ON locations BEGIN
+        {_price_stats_delta('-', _location_prices('OLD'))}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_locations_update_stats
+    AFTER UPDATE OF borough_id, listing_id ON locations BEGIN
+        {_price_stats_delta('-', _location_prices('OLD'))}
+        {_price_stats_delta('+', _location_prices('NEW'))}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_security_insert_stats AFTER INSERT ON security BEGIN
+        {_crime_stats_delta('+', 'NEW')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_security_delete_stats AFTER DELETE ON security BEGIN
+        {_crime_stats_delta('-', 'OLD')}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_security_update_stats
+    AFTER UPDATE OF borough_id, crime_level, crime_level_weight ON security BEGIN
+        {_crime_stats_delta('-', 'OLD')}
+        {_crime_stats_delta('+', 'NEW')}
+    END""",
+]
+
+
+def _neighborhood_stats_delta(sign, source):
+    """把 source 子查詢的 (borough_id, neighborhood, room_type, price) 加入或扣出 neighborhood_price_stats"""
+    return f"""
+        INSERT INTO neighborhood_price_stats (borough_id, neighborhood, room_type, listing_count, price_sum)
+        SELECT borough_id, IFNULL(neighborhood, ''), IFNULL(room_type, ''), {sign}1, {sign}price
+        FROM ({source})
+        WHERE price > 0 AND borough_id IS NOT NULL
+        ON CONFLICT(borough_id, neighborhood, room_type) DO UPDATE SET
+            listing_count = listing_count + excluded.listing_count,
+            price_sum = price_sum + excluded.price_sum;"""
+
+
+def _listing_neighborhood_prices(row):
+    return f"SELECT loc.borough_id, loc.borough AS neighborhood, {row}.room_type AS room_type, " \
+           f"{row}.price AS price FROM locations loc WHERE loc.listing_id = {row}.listing_id"
+
+
+def _location_neighborhood_prices(row):
+    return f"SELECT {row}.borough_id AS borough_id, {row}.borough AS neighborhood, l.room_type, l.price " \
+           f"FROM listings l WHERE l.listing_id = {row}.listing_id"
+
+
+# 行政區 → 街區 → 房型的階層彙總（locations.borough 欄位實際存放的是街區名稱），
+# 主鍵以 borough_id 開頭，點選行政區時只讀取該行政區的街區資料列
+NEIGHBORHOOD_STATS = [
+    """CREATE TABLE IF NOT EXISTS neighborhood_price_stats (
+        borough_id INTEGER NOT NULL,
+        neighborhood TEXT NOT NULL,
+        room_type TEXT NOT NULL,
+        listing_count INTEGER NOT NULL,
+        price_sum INTEGER NOT NULL,
+        PRIMARY KEY (borough_id, neighborhood, room_type)
+    ) WITHOUT ROWID""",
+    "DELETE FROM neighborhood_price_stats",
+    """INSERT INTO neighborhood_price_stats (borough_id, neighborhood, room_type, listing_count, price_sum)
+    SELECT loc.borough_id, IFNULL(loc.borough, ''), IFNULL(l.room_type, ''), COUNT(*), SUM(l.price)
+    FROM listings l
+    JOIN locations loc ON l.listing_id = loc.listing_id
+    WHERE l.price > 0 AND loc.borough_id IS NOT NULL
+    GROUP BY loc.borough_id, IFNULL(loc.borough, ''), IFNULL(l.room_type, '')""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_listings_insert_neighborhood_stats AFTER INSERT ON listings BEGIN
+        {_neighborhood_stats_delta('+', _listing_neighborhood_prices('NEW'))}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_listings_delete_neighborhood_stats AFTER DELETE ON listings BEGIN
+        {_neighborhood_stats_delta('-', _listing_neighborhood_prices('OLD'))}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_listings_update_neighborhood_stats
+    AFTER UPDATE OF listing_id, room_type, price ON listings BEGIN
+        {_neighborhood_stats_delta('-', _listing_neighborhood_prices('OLD'))}
+        {_neighborhood_stats_delta('+', _listing_neighborhood_prices('NEW'))}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_locations_insert_neighborhood_stats AFTER INSERT ON locations BEGIN
+        {_neighborhood_stats_delta('+', _location_neighborhood_prices('NEW'))}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_locations_delete_neighborhood_stats AFTER DELETE ON locations BEGIN
+        {_neighborhood_stats_delta('-', _location_neighborhood_prices('OLD'))}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_locations_update_neighborhood_stats
+    AFTER UPDATE OF borough_id, borough, listing_id ON locations BEGIN
+        {_neighborhood_stats_delta('-', _location_neighborhood_prices('OLD'))}
+        {_neighborhood_stats_delta('+', _location_neighborhood_prices('NEW'))}
+    END""",
+]
+
+
+def _rtree_insert(row):
+    """把 locations 的一筆資料（NEW）加入 R*Tree（座標為 NULL 的資料不建索引）"""
+    return f"""
+        INSERT INTO locations_rtree (id, min_lon, max_lon, min_lat, max_lat)
+        SELECT {row}.location_id, {row}.longitude, {row}.longitude, {row}.latitude, {row}.latitude
+        WHERE {row}.longitude IS NOT NULL AND {row}.latitude IS NOT NULL;"""
+
+
+# 房源座標的 R*Tree 空間索引（id 為 locations.location_id），供地圖縮放時只查詢可見範圍
+LOCATION_RTREE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS locations_rtree "
+    "USING rtree(id, min_lon, max_lon, min_lat, max_lat)",
+    "DELETE FROM locations_rtree",
+    """INSERT INTO locations_rtree (id, min_lon, max_lon, min_lat, max_lat)
+    SELECT location_id, longitude, longitude, latitude, latitude
+    FROM locations
+    WHERE longitude IS NOT NULL AND latitude IS NOT NULL""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_locations_insert_rtree AFTER INSERT ON locations BEGIN
+        {_rtree_insert('NEW')}
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_locations_delete_rtree AFTER DELETE ON locations BEGIN
+        DELETE FROM locations_rtree WHERE id = OLD.location_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_locations_update_rtree
+    AFTER UPDATE OF location_id, longitude, latitude ON locations BEGIN
+        DELETE FROM locations_rtree WHERE id = OLD.location_id;
+        {_rtree_insert('NEW')}
+    END""",
+]
+
+
+# 版本化的資料庫結構變更，版本號記錄在 PRAGMA user_version
+MIGRATIONS = [
+    (1, "listings / locations / borough 連接用的覆蓋索引", [
+        "CREATE INDEX IF NOT EXISTS idx_locations_listing_borough "
+        "ON locations(listing_id, borough_id)",
+        "CREATE INDEX IF NOT EXISTS idx_locations_borough_listing "
+        "ON locations(borough_id, listing_id)",
+        "CREATE INDEX IF NOT EXISTS idx_listings_price_room_host "
+        "ON listings(price, room_type, host_id)",
+        "CREATE INDEX IF NOT EXISTS idx_security_borough_level "
+        "ON security(borough_id, crime_level, crime_level_weight)",
+    ]),
+    (2, "行政區房價與犯罪彙總表", AGGREGATE_TABLES + AGGREGATE_REBUILD + AGGREGATE_TRIGGERS),
+    (3, "房源座標 R*Tree 空間索引", LOCATION_RTREE),
+    (4, "行政區 → 街區 → 房型房價彙總表", NEIGHBORHOOD_STATS),
+]
+
+# 不允許被整表掃描的大型資料表
+LARGE_TABLES = {"listings", "locations", "hosts", "security"}
+
+
+def get_schema_version(conn):
+    """讀取目前的結構版本"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def upgrade(db_path=None):
+    """套用尚未執行的 migration，回傳這次套用的版本列表"""
+    db_path = db_path or db.DB_PATH
+    applied = []
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        for version, description, statements in MIGRATIONS:
+            # 以 IMMEDIATE 交易取得寫入鎖，避免多個行程同時升級
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if get_schema_version(conn) >= version:
+                    conn.execute("ROLLBACK")
+                    continue
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {int(version)}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            print(f"Applied migration {version}: {description}")
+            applied.append(version)
+
+        # 更新查詢規劃器的統計資料
+        if applied:
+            conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    return applied
+
+
+def dashboard_queries():
+    """回傳儀表板會執行的查詢（名稱, SQL, 綁定參數）"""
+    from fig_crime import CRIME_QUERY
+    from fig_neighborhood import NEIGHBORHOOD_QUERY
+    from fig_density import VIEWPORT_COUNT_QUERY, VIEWPORT_QUERY, NYC_BOUNDS, viewport_params
+    from fig_potential import POTENTIAL_QUERY
+    from fig_price import PRICE_QUERY
+    from fig_room import ROOM_QUERY
+
+    return [
+        ("price (all boroughs)", PRICE_QUERY, db.borough_params()),
+        ("price (selected)", PRICE_QUERY, db.borough_params(["Bronx", "Queens"])),
+        ("room (all boroughs)", ROOM_QUERY, db.borough_params()),
+        ("room (selected)", ROOM_QUERY, db.borough_params(["Manhattan"])),
+        ("crime", CRIME_QUERY, {}),
+        ("potential", POTENTIAL_QUERY, {}),
+        ("neighborhood", NEIGHBORHOOD_QUERY, {'borough': "Manhattan"}),
+        ("viewport count", VIEWPORT_COUNT_QUERY, viewport_params(NYC_BOUNDS)),
+        ("viewport", VIEWPORT_QUERY, viewport_params(NYC_BOUNDS)),
+    ]
+
+
+def _table_aliases(query):
+    """從 FROM / JOIN 子句取得 別名 -> 資料表 的對應"""
+    aliases = {}
+    for table, alias in re.findall(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", query, re.I):
+        if alias and alias.upper() not in ("ON", "JOIN", "WHERE", "LEFT", "INNER", "GROUP", "ORDER"):
+            aliases[alias] = table
+        aliases[table] = table
+    return aliases
+
+
+def check_query_plans(db_path=None):
+    """以 EXPLAIN QUERY PLAN 檢查查詢，回傳對大型資料表做整表掃描的項目"""
+    db_path = db_path or db.DB_PATH
+    problems = []
+    conn = sqlite3.connect(Path(db_path).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        for name, query, params in dashboard_queries():
+            aliases = _table_aliases(query)
+            for row in conn.execute("EXPLAIN QUERY PLAN " + query, params):
+                detail = row[3]
+                match = re.match(r"SCAN (\w+)", detail)
+                if match and aliases.get(match.group(1), match.group(1)).lower() in LARGE_TABLES:
+                    problems.append((name, detail))
+    finally:
+        conn.close()
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="升級儀表板資料庫結構")
+    parser.add_argument("--db", default=db.DB_PATH, help="SQLite 資料庫路徑")
+    parser.add_argument("--check", action="store_true",
+                        help="只檢查查詢計畫，若有整表掃描則回傳非零狀態")
+    args = parser.parse_args()
+
+    if not args.check:
+        upgrade(args.db)
+        conn = sqlite3.connect(args.db)
+        print(f"Schema version: {get_schema_version(conn)}")
+        conn.close()
+
+    problems = check_query_plans(args.db)
+    for name, detail in problems:
+        print(f"Full scan in {name} query: {detail}")
+
+    # --check 模式下，任何整表掃描都視為失敗
+    sys.exit(1 if args.check and problems else 0)
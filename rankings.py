@@ -0,0 +1,115 @@
+import os
+import threading
+
+import pandas as pd
+
+import db
+
+
+# 每個行政區的房源數、觀光收入與犯罪權重（讀取 migration 建立的彙總表）
+RANKING_QUERY = """
+SELECT
+    b.borough_name AS borough,
+    b.tourist_revenue AS tourism_value,
+    IFNULL((SELECT SUM(p.listing_count) FROM borough_price_stats p
+            WHERE p.borough_id = b.borough_id), 0) AS listings_count,
+    IFNULL((SELECT SUM(c.weight_sum) FROM borough_crime_stats c
+            WHERE c.borough_id = b.borough_id), 0) AS crime_score
+FROM
+    borough b
+ORDER BY
+    b.borough_name;
+"""
+
+# 投資分數：觀光收入與安全程度各自正規化到 0~1 後加權
+INVESTMENT_WEIGHTS = {'tourism': 2 / 3, 'safety': 1 / 3}
+
+# 資料庫無法讀取時的備用資料
+FALLBACK_DATA = pd.DataFrame({
+    'borough': ['Bronx', 'Brooklyn', 'Manhattan', 'Queens', 'Staten Island'],
+    'tourism_value': [955, 2973, 32831, 9938, 456],
+    'listings_count': [948, 7717, 8038, 3753, 373],
+    'crime_score': [47, 93, 30, 52, 11]
+})
+
+_lock = threading.Lock()
+_cache = {'version': None, 'rankings': None}
+
+
+def _normalize(values):
+    """min-max 正規化到 0~1（全部相同時為 0）"""
+    spread = values.max() - values.min()
+    if not spread:
+        return values * 0.0
+    return (values - values.min()) / spread
+
+
+def compute_rankings(df):
+    """由各行政區數值計算投資分數與排名
+
+    crime_rank 1 為犯罪權重最高，investment_rank 1 為投資分數最高。
+    回傳 {行政區: {listings_count, tourism_value, crime_score, investment_score, crime_rank, investment_rank}}
+    """
+    df = df.set_index('borough')
+    score = (
+        INVESTMENT_WEIGHTS['tourism'] * _normalize(df['tourism_value'].astype(float))
+        + INVESTMENT_WEIGHTS['safety'] * (1 - _normalize(df['crime_score'].astype(float)))
+    )
+    crime_rank = df['crime_score'].rank(ascending=False, method='first').astype(int)
+    investment_rank = score.rank(ascending=False, method='first').astype(int)
+
+    return {
+        borough: {
+            'listings_count': int(df.at[borough, 'listings_count']),
+            'tourism_value': int(df.at[borough, 'tourism_value']),
+            'crime_score': int(df.at[borough, 'crime_score']),
+            'investment_score': round(float(score[borough]), 4),
+            'crime_rank': int(crime_rank[borough]),
+            'investment_rank': int(investment_rank[borough])
+        }
+        for borough in df.index
+    }
+
+
+def load_rankings():
+    """從資料庫計算排名（不使用快取）"""
+    try:
+        # 共用連線以 immutable 模式開啟，看不到資料庫更新，這裡另開連線讀取最新內容
+        df = db.read_sql_query(RANKING_QUERY, name='rankings', fresh=True)
+        if df.empty:
+            raise ValueError("Database query returned no results")
+    except Exception as e:
+        print(f"資料庫錯誤: {e}")
+        df = FALLBACK_DATA
+    return compute_rankings(df)
+
+
+def data_version():
+    """資料庫檔案的路徑、修改時間與大小，任一變動即視為資料已更新"""
+    try:
+        stat = os.stat(db.DB_PATH)
+    except OSError:
+        return (db.DB_PATH, None, None)
+    return (db.DB_PATH, stat.st_mtime_ns, stat.st_size)
+
+
+def current():
+    """取得 (資料版本, 排名)，資料庫變動後才重新計算"""
+    version = data_version()
+    with _lock:
+        if _cache['version'] != version:
+            _cache['rankings'] = load_rankings()
+            _cache['version'] = version
+        return _cache['version'], _cache['rankings']
+
+
+def get_rankings():
+    """取得快取的排名，資料庫變動後才重新計算"""
+    return current()[1]
+
+
+def reset_rankings():
+    """清除快取（例如切換資料庫後）"""
+    with _lock:
+        _cache['version'] = None
+        _cache['rankings'] = None
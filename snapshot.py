@@ -0,0 +1,140 @@
+import argparse
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+import pandas as pd
+
+import dataset
+import db
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+# 快照輸出目錄（未設定則與資料庫放在同一個資料夾，檔名為 <資料庫檔名>.arrow / .parquet）
+SNAPSHOT_DIR = os.environ.get('DATASET_SNAPSHOT_DIR')
+
+# 文字欄位以字典編碼存放，載入時直接成為 pandas Categorical，不需逐列建立字串
+CATEGORICAL_COLUMNS = ['borough', 'host_name', 'room_type']
+
+
+def snapshot_paths(db_path=None, snapshot_dir=None):
+    """回傳資料庫對應的 (Arrow IPC 檔, Parquet 檔) 路徑"""
+    db_path = db_path or db.DB_PATH
+    snapshot_dir = snapshot_dir or SNAPSHOT_DIR or os.path.dirname(os.path.abspath(db_path))
+    stem = os.path.join(snapshot_dir, Path(db_path).stem)
+    return stem + '.arrow', stem + '.parquet'
+
+
+def source_version(db_path=None):
+    """資料庫檔案的修改時間與大小，寫入快照的 metadata，任一變動即視為快照過期"""
+    stat = os.stat(db_path or db.DB_PATH)
+    return {b'source_mtime_ns': str(stat.st_mtime_ns).encode(), b'source_size': str(stat.st_size).encode()}
+
+
+def _is_fresh(metadata, db_path=None):
+    version = source_version(db_path)
+    return all((metadata or {}).get(key) == value for key, value in version.items())
+
+
+def build_snapshot(db_path=None, snapshot_dir=None):
+    """把 DATASET_QUERY 的結果匯出成 Arrow IPC 檔與 Parquet 檔，回傳 (資料列數, Arrow 路徑, Parquet 路徑)
+
+    Arrow IPC 檔不壓縮且只有一個 record batch，載入時可直接記憶體映射、數值欄位不需複製；
+    Parquet 檔以 zstd 壓縮，體積較小，方便保存或搬移。
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is required to build the dataset snapshot (pip install pyarrow)")
+    db_path = db_path or db.DB_PATH
+    arrow_path, parquet_path = snapshot_paths(db_path, snapshot_dir)
+
+    conn = sqlite3.connect(Path(db_path).resolve().as_uri() + '?mode=ro', uri=True)
+    try:
+        df = pd.read_sql_query(dataset.DATASET_QUERY, conn)
+    finally:
+        conn.close()
+    # 與 ListingDataset 相同的 Categorical（類別依字母排序），載入後的結果與查詢 SQLite 一致
+    for column in CATEGORICAL_COLUMNS:
+        df[column] = pd.Categorical(df[column])
+
+    table = pa.Table.from_pandas(df, preserve_index=False).combine_chunks()
+    table = table.replace_schema_metadata(source_version(db_path))
+
+    os.makedirs(os.path.dirname(arrow_path), exist_ok=True)
+    # 先寫入暫存檔再改名，避免其他 worker 映射到寫到一半的檔案
+    tmp_path = f"{arrow_path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=max(len(table), 1))
+    os.replace(tmp_path, arrow_path)
+
+    tmp_path = f"{parquet_path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, parquet_path)
+    return len(table), arrow_path, parquet_path
+
+
+def _column(table, name):
+    """把 Arrow 欄位轉成 pd.Series；沒有 NULL 的數值欄位直接指向 Arrow 的記憶體，不複製"""
+    column = table.column(name)
+    array = column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+    if pa.types.is_dictionary(array.type):
+        codes = array.indices.fill_null(-1).to_numpy(zero_copy_only=False)
+        values = pd.Categorical.from_codes(codes, categories=array.dictionary.to_pandas())
+    else:
+        values = array.to_numpy(zero_copy_only=False)
+    return pd.Series(values, name=name, copy=False)
+
+
+def read_snapshot(db_path=None, snapshot_dir=None, use_arrow=True):
+    """讀取資料庫對應的快照，回傳 {欄位: pd.Series}（可直接傳給 ListingDataset）
+
+    優先以記憶體映射開啟 Arrow IPC 檔：資料頁由作業系統的 page cache 提供，
+    同一台機器上的 gunicorn worker 共用同一份實體記憶體；沒有 Arrow 檔（或 use_arrow 為 False）
+    時改讀 Parquet（需解壓縮到各 worker 自己的記憶體）。沒有快照、快照比資料庫舊、
+    讀取失敗或未安裝 pyarrow 時回傳 None，由呼叫端改查 SQLite。
+    """
+    db_path = db_path or db.DB_PATH
+    arrow_path, parquet_path = snapshot_paths(db_path, snapshot_dir)
+    use_arrow = use_arrow and os.path.exists(arrow_path)
+    if not use_arrow and not os.path.exists(parquet_path):
+        return None
+    if pa is None:
+        print("Dataset snapshot found but pyarrow is not installed, loading from SQLite")
+        return None
+
+    try:
+        if use_arrow:
+            reader = pa.ipc.open_file(pa.memory_map(arrow_path, 'r'))
+            metadata = reader.schema.metadata
+        else:
+            metadata = pq.read_schema(parquet_path).metadata
+        if not _is_fresh(metadata, db_path):
+            print("Dataset snapshot is older than the database, loading from SQLite "
+                  "(rebuild it with python snapshot.py)")
+            return None
+        table = reader.read_all() if use_arrow else pq.read_table(parquet_path)
+        return {name: _column(table, name) for name in table.column_names}
+    except Exception as e:
+        print(f"Error loading dataset snapshot: {e}")
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把房源資料匯出成 Arrow IPC 與 Parquet 快照，加快 worker 啟動")
+    parser.add_argument("--db", default=db.DB_PATH, help="SQLite 資料庫路徑")
+    parser.add_argument("--out-dir", default=SNAPSHOT_DIR,
+                        help="輸出目錄（預設與資料庫相同，檔名為 <資料庫檔名>.arrow / .parquet）")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rows, arrow_path, parquet_path = build_snapshot(args.db, args.out_dir)
+    for path in (arrow_path, parquet_path):
+        print(f"{path}: {os.path.getsize(path):,} bytes")
+    print(f"{rows:,} listings in {time.perf_counter() - start:.1f}s")
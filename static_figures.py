@@ -0,0 +1,144 @@
+import hashlib
+import os
+import threading
+
+import db
+import figure_json
+import metrics
+import rankings
+from fig_crime import create_crime_figure
+from fig_density import create_density_figure
+from fig_map import create_map_figure
+from fig_potential import create_potential_figure
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 不隨使用者操作改變的圖表
+STATIC_FIGURES = {
+    'map': create_map_figure,
+    'potential': create_potential_figure,
+    'crime': create_crime_figure,
+    'density': create_density_figure,
+}
+
+# 影響靜態圖表內容的素材與程式檔
+ARTIFACT_SOURCES = [
+    os.path.join(BASE_DIR, 'assets', 'images', 'map_final.jpg'),
+    os.path.join(BASE_DIR, 'fig_map.py'),
+    os.path.join(BASE_DIR, 'fig_potential.py'),
+    os.path.join(BASE_DIR, 'fig_crime.py'),
+    os.path.join(BASE_DIR, 'fig_density.py'),
+    os.path.join(BASE_DIR, 'dataset.py'),
+    os.path.join(BASE_DIR, 'rankings.py'),
+]
+
+# 依 rankings 排名建立的圖表：資料庫變動後以新排名重建（builder 需接受 borough_data 參數）
+RANKING_FIGURES = {'map'}
+
+# 磁碟快取目錄（未設定則只保留在記憶體）
+FIGURE_CACHE_DIR = os.environ.get('FIGURE_CACHE_DIR')
+
+_figures = {}
+_builder_kwargs = {}
+_ranking_versions = {}
+_lock = threading.Lock()
+
+
+def _file_hash(path, chunk_size=1 << 20):
+    """計算檔案內容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def artifact_key(map_image_url=None):
+    """以資料庫內容雜湊與素材修改時間組成快取 key"""
+    digest = hashlib.sha256(str(map_image_url).encode())
+    if os.path.exists(db.DB_PATH):
+        digest.update(_file_hash(db.DB_PATH).encode())
+    for path in ARTIFACT_SOURCES:
+        if os.path.exists(path):
+            digest.update(f"{path}:{os.path.getmtime(path)}".encode())
+    return digest.hexdigest()[:16]
+
+
+def _cache_path(name, key):
+    return os.path.join(FIGURE_CACHE_DIR, f"{name}-{key}.json")
+
+
+def _load_from_disk(name, key):
+    if not FIGURE_CACHE_DIR:
+        return None
+    try:
+        with open(_cache_path(name, key), encoding='utf-8') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _save_to_disk(name, key, payload):
+    if not FIGURE_CACHE_DIR:
+        return
+    try:
+        os.makedirs(FIGURE_CACHE_DIR, exist_ok=True)
+        # 先寫入暫存檔再改名，避免其他 worker 讀到寫到一半的檔案
+        tmp_path = _cache_path(name, key) + f".{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_path, _cache_path(name, key))
+    except OSError as e:
+        print(f"Error writing figure cache: {e}")
+
+
+def build_static_figures(map_image_url=None):
+    """建立（或從磁碟快取讀取）所有靜態圖表，存放在記憶體中
+
+    map_image_url 為地圖背景圖片的靜態檔網址，未提供時地圖會內嵌圖片。
+    """
+    # 只有使用磁碟快取時才需要 key（計算時要讀取整個資料庫檔案）
+    key = artifact_key(map_image_url) if FIGURE_CACHE_DIR else None
+    version, borough_data = rankings.current()
+    with _lock:
+        _builder_kwargs['map'] = {'image_url': map_image_url}
+        for name, builder in STATIC_FIGURES.items():
+            kwargs = dict(_builder_kwargs.get(name, {}))
+            if name in RANKING_FIGURES:
+                kwargs['borough_data'] = borough_data
+                _ranking_versions[name] = (version, borough_data)
+            payload = _load_from_disk(name, key)
+            if payload is None:
+                with metrics.timer(metrics.FIGURE_BUILD_SECONDS, name):
+                    payload = figure_json.to_json(builder(**kwargs))
+                _save_to_disk(name, key, payload)
+            _figures[name] = figure_json.with_arrays(figure_json.loads(payload))
+    return _figures
+
+
+def get_ranking_figure(name):
+    """取得依排名建立的圖表與所用的排名 (figure, borough_data)，資料庫變動後以新排名重建
+
+    同一頁面上的地圖數字與排名資料（卡片、最佳投資面板）應取自這裡回傳的同一份排名。
+    """
+    if name not in _figures:
+        build_static_figures()
+    version, borough_data = rankings.current()
+    with _lock:
+        if _ranking_versions[name][0] != version:
+            kwargs = dict(_builder_kwargs.get(name, {}), borough_data=borough_data)
+            with metrics.timer(metrics.FIGURE_BUILD_SECONDS, name):
+                payload = figure_json.to_json(STATIC_FIGURES[name](**kwargs))
+            _figures[name] = figure_json.with_arrays(figure_json.loads(payload))
+            _ranking_versions[name] = (version, borough_data)
+        return _figures[name], _ranking_versions[name][1]
+
+
+def get_static_figure(name):
+    """取得已建立的靜態圖表（dict，可直接作為 dcc.Graph 的 figure）"""
+    if name in RANKING_FIGURES:
+        return get_ranking_figure(name)[0]
+    if name not in _figures:
+        build_static_figures()
+    return _figures[name]
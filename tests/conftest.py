@@ -0,0 +1,114 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# 測試直接匯入專案根目錄的模組
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from figure_cache import BOROUGHS, all_selections  # noqa: E402
+
+
+# 密度圖縮放測試的 relayoutData：全市、曼哈頓、中城、數個街區
+VIEWPORTS = [
+    {'xaxis.autorange': True, 'yaxis.autorange': True},
+    {'xaxis.range[0]': -74.03, 'xaxis.range[1]': -73.90, 'yaxis.range[0]': 40.70, 'yaxis.range[1]': 40.88},
+    {'xaxis.range[0]': -74.00, 'xaxis.range[1]': -73.97, 'yaxis.range[0]': 40.745, 'yaxis.range[1]': 40.765},
+    {'xaxis.range[0]': -73.99, 'xaxis.range[1]': -73.985, 'yaxis.range[0]': 40.755, 'yaxis.range[1]': 40.758},
+]
+
+# 散佈點降採樣測試的點數
+POINT_COUNTS = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+
+def selection_id(selection):
+    return '+'.join(selection) or 'all'
+
+
+@pytest.fixture(params=all_selections(), ids=selection_id)
+def selection(request):
+    """所有 2^5 = 32 種行政區組合（包含未選擇）"""
+    return request.param
+
+
+def selection_request(action, current_selections, figure_status=None, charts=('price', 'room', 'neighborhood')):
+    """組出 update_selection callback 的 /_dash-update-component 請求內容（charts 為更新的圖表）"""
+    names = [b['name'] for b in current_selections]
+    click = None
+    close_clicks = [None] * len(names)
+    clear_clicks = None
+
+    if action['type'] == 'click':
+        click = {'points': [{'customdata': [action['borough'], 0, 0, 1, 1]}]}
+        changed = 'nyc-map.clickData'
+    elif action['type'] == 'close':
+        close_clicks[names.index(action['borough'])] = 1
+        changed = json.dumps({'index': action['borough'], 'type': 'close-button'},
+                             separators=(',', ':')) + '.n_clicks'
+    else:
+        clear_clicks = 1
+        changed = 'clear-selection-button.n_clicks'
+
+    outputs = (
+        [{'id': 'selected-boroughs-store', 'property': 'data'}]
+        + [{'id': f'{name}-graph', 'property': 'figure'} for name in charts]
+        + [{'id': 'figure-status-store', 'property': 'data'}]
+    )
+    return {
+        'output': '..' + '...'.join(f"{o['id']}.{o['property']}" for o in outputs) + '..',
+        'outputs': outputs,
+        'inputs': [
+            {'id': 'nyc-map', 'property': 'clickData', 'value': click},
+            [
+                {'id': {'type': 'close-button', 'index': name}, 'property': 'n_clicks', 'value': value}
+                for name, value in zip(names, close_clicks)
+            ],
+            {'id': 'clear-selection-button', 'property': 'n_clicks', 'value': clear_clicks},
+        ],
+        'state': [
+            {'id': 'selected-boroughs-store', 'property': 'data', 'value': current_selections},
+            {'id': 'figure-status-store', 'property': 'data', 'value': figure_status or {}},
+        ],
+        'changedPropIds': [changed],
+    }
+
+
+def selection_actions():
+    """依序點選每個行政區、逐一關閉，再點選全部後清除"""
+    actions = [{'type': 'click', 'borough': b} for b in BOROUGHS]
+    actions += [{'type': 'close', 'borough': b} for b in BOROUGHS]
+    actions += [{'type': 'click', 'borough': b} for b in reversed(BOROUGHS)]
+    actions.append({'type': 'clear'})
+    return actions
+
+
+class CallbackDriver:
+    """透過 Flask test client 依序送出選擇動作，並追蹤 store 狀態"""
+
+    def __init__(self):
+        import app
+        self.client = app.server.test_client()
+        self.charts = app.SELECTION_CHARTS
+        self.selections = []
+        self.figure_status = {}
+
+    def send(self, action):
+        response = self.client.post(
+            '/_dash-update-component',
+            json=selection_request(action, self.selections, self.figure_status, self.charts)
+        )
+        if response.status_code == 200:
+            body = json.loads(response.data)
+            self.selections = body['response']['selected-boroughs-store']['data']
+            self.figure_status = body['response']['figure-status-store']['data']
+        return response.data
+
+
+def synthetic_points(n, seed=0):
+    """以 20 個群聚中心產生 n 個散佈點，回傳 (x, y, 編號)"""
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(0, 1, (20, 2))
+    xy = centers[rng.integers(0, len(centers), n)] + rng.normal(0, 0.05, (n, 2))
+    return xy[:, 0], xy[:, 1], np.arange(n)
@@ -0,0 +1,147 @@
+import json
+
+import pytest
+
+import dataset
+import figure_cache
+from conftest import CallbackDriver, selection_actions
+from figure_cache import BOROUGHS
+from figure_patch import diff_figure, payload_size
+
+# 地圖改用靜態檔網址後，地圖 figure 不應再內嵌圖片
+MAX_MAP_FIGURE_BYTES = 20 * 1024
+
+# 使用者在頁面上點擊時直接改變的屬性：地圖、卡片關閉按鈕、清除全部
+CLICK_INPUTS = [
+    'nyc-map.clickData',
+    '{"index":["ALL"],"type":"close-button"}.n_clicks',
+    'clear-selection-button.n_clicks',
+]
+
+
+@pytest.fixture(scope='module')
+def client():
+    import app
+    return app.server.test_client()
+
+
+def find_component(node, component_id):
+    """在 /_dash-layout 的 JSON 中找出指定 id 的元件 props"""
+    if isinstance(node, dict):
+        props = node.get('props', {})
+        if props.get('id') == component_id:
+            return props
+        children = node.values()
+    elif isinstance(node, list):
+        children = node
+    else:
+        return None
+    for child in children:
+        found = find_component(child, component_id)
+        if found is not None:
+            return found
+    return None
+
+
+def output_properties(output):
+    """callback_map 的 key（單一輸出 'id.prop' 或多重輸出 '..id.prop...id.prop..'）拆成屬性列表"""
+    if output.startswith('..') and output.endswith('..'):
+        return output[2:-2].split('...')
+    return [output]
+
+
+def server_callbacks_fired_by(callback_map, changed):
+    """changed 屬性改變後，連鎖觸發（包含經由瀏覽器端 callback）的伺服器 callback"""
+    fired = set()
+    pending = [changed]
+    seen = {changed}
+    while pending:
+        prop = pending.pop()
+        for output, callback in callback_map.items():
+            if not any(f"{i['id']}.{i['property']}" == prop for i in callback['inputs']):
+                continue
+            if 'callback' in callback:
+                fired.add(output)
+            for next_prop in output_properties(output):
+                if next_prop not in seen:
+                    seen.add(next_prop)
+                    pending.append(next_prop)
+    return fired
+
+
+def test_map_figure_links_background_image(client):
+    """初始 layout 中的地圖以靜態檔網址引用背景圖片，不內嵌 base64"""
+    layout = json.loads(client.get('/_dash-layout').data)
+    map_json = json.dumps(find_component(layout, 'nyc-map')['figure'])
+    assert 'data:image' not in map_json
+    assert len(map_json) <= MAX_MAP_FIGURE_BYTES
+
+
+def test_toggle_patch_smaller_than_full_figure(selection):
+    """切換一個行政區時，價格 / 房型圖的 Patch 應比完整 figure 小"""
+    for borough in BOROUGHS:
+        toggled = sorted(set(selection) ^ {borough})
+        for build in (figure_cache.price_figure, figure_cache.room_figure):
+            new_figure = build(toggled)
+            patch = diff_figure(build(selection), new_figure)
+            assert payload_size(patch) < payload_size(new_figure), (build.__name__, borough)
+
+
+def test_each_click_fires_one_server_callback(client):
+    """每種點擊（連同它更新的 store 所連鎖觸發的 callback）只會送出一次伺服器請求"""
+    import app
+
+    callback_map = app.app.callback_map
+    selection_callback = next(
+        output for output in callback_map if 'selected-boroughs-store.data' in output_properties(output)
+    )
+    for changed in CLICK_INPUTS:
+        assert server_callbacks_fired_by(callback_map, changed) == {selection_callback}, changed
+
+
+def test_selection_actions_update_store_and_figures(client):
+    """點選、關閉與清除全部都由同一個 callback 更新 store 與圖表"""
+    driver = CallbackDriver()
+    for action in selection_actions():
+        body = json.loads(driver.send(action))['response']
+        assert {'price-graph', 'room-graph', 'neighborhood-graph'} <= body.keys()
+        names = [b['name'] for b in driver.selections]
+        if action['type'] == 'click':
+            assert action['borough'] in names
+        elif action['type'] == 'close':
+            assert action['borough'] not in names
+    assert driver.selections == []
+
+
+def test_click_updates_every_chart_in_one_response(client):
+    """點選行政區的同一個回應就包含價格圖、房型圖與該行政區的街區圖"""
+    import app
+
+    driver = CallbackDriver()
+    body = json.loads(driver.send({'type': 'click', 'borough': 'Bronx'}))
+    for name in app.SELECTION_CHARTS:
+        assert f'{name}-graph' in body['response']
+    assert driver.figure_status == {name: 'ok' for name in app.SELECTION_CHARTS}
+    assert [b['name'] for b in driver.selections] == ['Bronx']
+
+
+def test_failed_figure_reported_as_error(client, monkeypatch):
+    """圖表建立失敗時送出錯誤圖表並標記為 error，錯誤圖表不寫入快取"""
+    import app
+
+    def broken_dataset():
+        raise RuntimeError("dataset unavailable")
+
+    figure_cache.cache.clear()
+    monkeypatch.setattr(dataset, 'IN_MEMORY_DATASET', True)
+    monkeypatch.setattr(dataset, 'get_dataset', broken_dataset)
+    updates, status = app.render_selection([], ['Bronx'], charts=('price',))
+    assert status == {'price': 'error'}
+    assert updates['price'] == figure_cache.FALLBACK_FIGURES['price']()
+    assert figure_cache.price_key(['Bronx']) not in figure_cache.cache
+
+    # 資料恢復後，上一次為錯誤圖表的圖表送出完整 figure 而不是 Patch
+    monkeypatch.undo()
+    updates, status = app.render_selection(['Bronx'], ['Bronx', 'Queens'], status, charts=('price',))
+    assert status == {'price': 'ok'}
+    assert updates['price'] == figure_cache.price_figure(['Bronx', 'Queens'])
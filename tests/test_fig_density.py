@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+import db
+from fig_density import DENSITY_QUERY, NYC_BOUNDS, compute_density_grid, parse_viewport
+
+
+def in_bounds(longitude, latitude, bounds=NYC_BOUNDS):
+    return (
+        (longitude >= bounds['lon'][0]) & (longitude <= bounds['lon'][1])
+        & (latitude >= bounds['lat'][0]) & (latitude <= bounds['lat'][1])
+    )
+
+
+def test_grid_counts_sum_to_listing_count(selection):
+    """網格各格的房源數加總等於市界內的房源數，平均價格只計算有價格的房源"""
+    df = db.read_sql_query(DENSITY_QUERY, db.borough_params(selection), name='density')
+    longitude, latitude, price = df['longitude'].to_numpy(), df['latitude'].to_numpy(), df['price'].to_numpy()
+    grid = compute_density_grid(longitude, latitude, price)
+
+    inside = in_bounds(longitude, latitude)
+    assert np.nansum(grid['count']) == inside.sum()
+    assert grid['count'].shape == grid['avg_price'].shape == (len(grid['lat']), len(grid['lon']))
+
+    priced = inside & (price > 0)
+    weights = np.nan_to_num(grid['avg_price']) * np.nan_to_num(grid['count'])
+    assert np.nansum(weights) == pytest.approx(price[priced].sum(), rel=1e-3)
+
+
+def test_grid_places_points_in_their_cells():
+    """格子以 (緯度, 經度) 排列：西南角與東北角的點落在對角的兩格"""
+    longitude = np.array([NYC_BOUNDS['lon'][0], NYC_BOUNDS['lon'][1], NYC_BOUNDS['lon'][1], -75.0])
+    latitude = np.array([NYC_BOUNDS['lat'][0], NYC_BOUNDS['lat'][1], NYC_BOUNDS['lat'][1], 40.7])
+    grid = compute_density_grid(longitude, latitude, [100, 200, 0, 50], grid_size=4)
+
+    assert grid['count'][0, 0] == 1
+    assert grid['count'][-1, -1] == 2
+    assert np.nansum(grid['count']) == 3
+    # 價格為 0 的房源計入數量，但不計入平均價格
+    assert grid['avg_price'][-1, -1] == 200
+    assert np.isnan(grid['avg_price'][1, 1])
+
+
+@pytest.mark.parametrize('relayout_data', [
+    {'xaxis.autorange': True, 'yaxis.autorange': True},
+    {'autosize': True, 'xaxis.autorange': True, 'yaxis.autorange': True},
+    {'xaxis.autorange': True},
+])
+def test_reset_zoom_returns_full_bounds(relayout_data):
+    """重設縮放（雙擊或 Reset axes）回到完整的市界範圍"""
+    assert parse_viewport(relayout_data) == {'lon': NYC_BOUNDS['lon'], 'lat': NYC_BOUNDS['lat']}
+
+
+@pytest.mark.parametrize('relayout_data', [None, {}, {'autosize': True}, {'dragmode': 'pan'}])
+def test_unrelated_relayout_is_ignored(relayout_data):
+    """與縮放無關的 relayout 事件不更新房源點"""
+    assert parse_viewport(relayout_data) is None
+
+
+def test_zoom_uses_range_and_fills_missing_axis():
+    """框選縮放取用範圍（順序顛倒時排序），只變動一軸時另一軸為完整範圍"""
+    assert parse_viewport({
+        'xaxis.range[0]': -73.9, 'xaxis.range[1]': -74.0,
+        'yaxis.range[0]': 40.7, 'yaxis.range[1]': 40.8,
+    }) == {'lon': (-74.0, -73.9), 'lat': (40.7, 40.8)}
+    assert parse_viewport({'xaxis.range': [-74.0, -73.9]}) == {'lon': (-74.0, -73.9), 'lat': NYC_BOUNDS['lat']}
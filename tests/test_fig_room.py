@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from fig_room import create_room_figure
+
+
+def plotly_box_stats(values):
+    """Plotly.js box/calc.js 預設（quartilemethod='linear'）的四分位數與鬚線"""
+    values = np.sort(np.asarray(values, dtype=np.float64))
+    n = len(values)
+
+    def interp(p):
+        position = n * p - 0.5
+        if position < 0:
+            return values[0]
+        if position > n - 1:
+            return values[-1]
+        frac = position % 1
+        return frac * values[int(np.ceil(position))] + (1 - frac) * values[int(np.floor(position))]
+
+    q1, median, q3 = interp(0.25), interp(0.5), interp(0.75)
+    lowerfence = min(q1, values[np.searchsorted(values, 2.5 * q1 - 1.5 * q3, side='left')])
+    upperfence = max(q3, values[np.searchsorted(values, 2.5 * q3 - 1.5 * q1, side='right') - 1])
+    return [q1, median, q3, lowerfence, upperfence]
+
+
+def test_summary_box_matches_plotly(selection):
+    """摘要模式送出的箱型統計量應與瀏覽器由完整資料算出的相同"""
+    summary = create_room_figure(list(selection), summary=True)
+    full = create_room_figure(list(selection), summary=False)
+
+    expected = {trace.name: plotly_box_stats(trace.y) for trace in full.data}
+    actual = {
+        trace.name: [trace.q1[0], trace.median[0], trace.q3[0], trace.lowerfence[0], trace.upperfence[0]]
+        for trace in summary.data if trace.type == 'box'
+    }
+    assert actual.keys() == expected.keys()
+    for room_type, stats in expected.items():
+        assert actual[room_type] == pytest.approx(stats), room_type
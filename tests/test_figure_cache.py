@@ -0,0 +1,95 @@
+import plotly.graph_objects as go
+import pytest
+
+import dataset
+import db
+import figure_cache
+from figure_cache import FigureCache
+
+
+class FakeClock:
+    """取代 time.monotonic，讓 TTL 測試不需要等待"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(figure_cache.time, 'monotonic', clock)
+    return clock
+
+
+def titled(title):
+    return lambda: go.Figure(layout={'title': {'text': title}})
+
+
+def test_lru_evicts_least_recently_used(clock):
+    """超過 maxsize 時淘汰最久沒有使用的項目，讀取會更新使用順序"""
+    cache = FigureCache(maxsize=2, ttl=60)
+    cache.get_json('a', titled('a'))
+    cache.get_json('b', titled('b'))
+    cache.get_json('a', titled('a'))
+    cache.get_json('c', titled('c'))
+
+    assert 'a' in cache and 'c' in cache
+    assert 'b' not in cache
+    assert cache.stats() == {'hits': 1, 'misses': 3, 'size': 2, 'maxsize': 2}
+
+
+def test_ttl_expires_entries(clock):
+    """超過 TTL 的項目視為未命中並重新建立"""
+    cache = FigureCache(maxsize=8, ttl=60)
+    calls = []
+
+    def builder():
+        calls.append(clock.now)
+        return titled('a')()
+
+    cache.get_json('a', builder)
+    clock.now += 60
+    cache.get_json('a', builder)
+    assert len(calls) == 1
+
+    clock.now += 1
+    assert 'a' not in cache
+    cache.get_json('a', builder)
+    assert len(calls) == 2
+    assert cache.stats()['misses'] == 2
+
+
+def test_builder_errors_are_not_cached():
+    """builder 拋出例外時不寫入快取，下次重新建立"""
+    cache = FigureCache(maxsize=8, ttl=60)
+
+    def broken():
+        raise RuntimeError("database unavailable")
+
+    with pytest.raises(RuntimeError):
+        cache.get_json('a', broken)
+    assert 'a' not in cache
+    assert cache.get('a', titled('a'))['layout']['title']['text'] == 'a'
+
+
+def test_cached_builders_raise_instead_of_caching_error_figure(monkeypatch):
+    """資料無法讀取時，快取版的價格 / 房型 / 街區圖拋出例外，不快取各模組的錯誤圖表"""
+    def broken(*args, **kwargs):
+        raise RuntimeError("database unavailable")
+
+    figure_cache.cache.clear()
+    monkeypatch.setattr(dataset, 'IN_MEMORY_DATASET', True)
+    monkeypatch.setattr(dataset, 'get_dataset', broken)
+    monkeypatch.setattr(db, 'read_sql_query', broken)
+
+    for build, key in [
+        (lambda: figure_cache.price_figure(['Queens']), figure_cache.price_key(['Queens'])),
+        (lambda: figure_cache.room_figure(['Queens']), figure_cache.room_key(['Queens'])),
+        (lambda: figure_cache.neighborhood_figure('Queens'), figure_cache.neighborhood_key('Queens')),
+    ]:
+        with pytest.raises(RuntimeError):
+            build()
+        assert key not in figure_cache.cache
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+import figure_points
+from conftest import POINT_COUNTS, synthetic_points
+
+
+@pytest.mark.parametrize('n', POINT_COUNTS.values(), ids=POINT_COUNTS.keys())
+def test_dense_points_decimated_to_pixel_cells(n):
+    """降採樣後的點數不超過繪圖區的像素格數，點多時改用 Scattergl，保留點維持原本順序"""
+    width, height = figure_points.DEFAULT_PLOT_SIZE
+    max_cells = (width // figure_points.DECIMATION_CELL_PX) * (height // figure_points.DECIMATION_CELL_PX)
+    x, y, ids = synthetic_points(n)
+    trace = figure_points.point_trace(x, y, customdata=ids, mode='markers')
+    assert len(trace.x) <= max_cells
+    assert trace.type == 'scattergl'
+    customdata = np.asarray(trace.customdata)
+    assert np.array_equal(customdata, np.sort(customdata))
+
+
+@pytest.mark.parametrize('n', POINT_COUNTS.values(), ids=POINT_COUNTS.keys())
+def test_lttb_keeps_endpoints(n):
+    """LTTB 每個像素寬保留 2 點，且保留首尾兩點"""
+    width = figure_points.DEFAULT_PLOT_SIZE[0]
+    _, y, _ = synthetic_points(n)
+    index = figure_points.lttb(np.arange(n), y, 2 * width)
+    assert len(index) == 2 * width
+    assert index[0] == 0 and index[-1] == n - 1
@@ -0,0 +1,121 @@
+import csv
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+import db
+import ingest
+
+# 觸發器增量維護的彙總表與 R*Tree：(資料表, 排序欄位, 計數欄位)
+MAINTAINED_TABLES = [
+    ('borough_price_stats', 'borough_id, room_type', 'listing_count'),
+    ('borough_crime_stats', 'borough_id, crime_level', 'event_count'),
+    ('neighborhood_price_stats', 'borough_id, neighborhood, room_type', 'listing_count'),
+    ('locations_rtree', 'id', None),
+]
+
+
+@pytest.fixture
+def csv_dir(tmp_path):
+    """data/ 內 CSV 的暫存副本"""
+    path = tmp_path / 'data'
+    shutil.copytree(ingest.DATA_DIR, path)
+    return str(path)
+
+
+@pytest.fixture
+def db_copy(tmp_path):
+    """專案資料庫的暫存副本"""
+    path = str(tmp_path / 'copy.sqlite3')
+    shutil.copyfile(db.DB_PATH, path)
+    return path
+
+
+def edit_csv(csv_dir, table, edit):
+    """以 edit(資料列 dict 列表) 回傳的資料列改寫 CSV"""
+    path = os.path.join(csv_dir, f"{table}.csv")
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        columns = reader.fieldnames
+        rows = edit(list(reader))
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def table_rows(db_path, table, order_by, count_column):
+    """資料表內容（計數為 0 的彙總列視為不存在，全部刪除後觸發器會留下這種資料列）"""
+    where = f"WHERE {count_column} != 0" if count_column else ""
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(f"SELECT * FROM {table} {where} ORDER BY {order_by}").fetchall()
+    finally:
+        conn.close()
+
+
+def test_reingest_unchanged_data_changes_nothing(db_copy):
+    """以相同的 CSV 重新載入時，沒有任何資料列被寫入"""
+    changes = ingest.ingest(db_path=db_copy)
+    assert set(changes) == {table for table, _, _ in ingest.TABLES}
+    assert all(count == 0 for count in changes.values()), changes
+
+
+def test_incremental_ingest_matches_full_rebuild(csv_dir, db_copy, tmp_path):
+    """改價格、房型、行政區並刪除 / 新增資料列後，觸發器維護的彙總表與 R*Tree 與全部重建的結果相同"""
+    def edit_listings(rows):
+        rows[0]['price'] = str(int(rows[0]['price']) + 100)
+        rows[1]['room_type'] = 'Hotel room' if rows[1]['room_type'] != 'Hotel room' else 'Shared room'
+        removed.append(rows[2]['listing_id'])
+        new_listing = dict(rows[3], listing_id='999999999', price='123')
+        return [row for row in rows if row['listing_id'] not in removed] + [new_listing]
+
+    def edit_locations(rows):
+        moved = next(row for row in rows if row['borough_id'] == '2')
+        moved.update(borough_id='3', borough='Midtown', latitude='40.755', longitude='-73.985')
+        new_location = dict(rows[0], location_id='999999999', listing_id='999999999', longitude='-73.95')
+        return [row for row in rows if row['listing_id'] not in removed] + [new_location]
+
+    def edit_security(rows):
+        rows[0]['crime_level_weight'] = str(int(rows[0]['crime_level_weight']) + 5)
+        rows[1]['borough_id'] = '5' if rows[1]['borough_id'] != '5' else '1'
+        return rows[:-1]
+
+    removed = []
+    edit_csv(csv_dir, 'listings', edit_listings)
+    edit_csv(csv_dir, 'locations', edit_locations)
+    edit_csv(csv_dir, 'security', edit_security)
+
+    changes = ingest.ingest(csv_dir, db_copy, delete_missing=True)
+    assert changes['listings'] == 4
+    # locations：搬到其他行政區、新增、隨房源刪除各一筆
+    assert changes['locations'] == 3
+    assert changes['security'] == 3
+    assert changes['borough'] == changes['hosts'] == 0
+
+    rebuilt = str(tmp_path / 'rebuilt.sqlite3')
+    ingest.ingest(csv_dir, rebuilt)
+    for table, order_by, count_column in MAINTAINED_TABLES:
+        incremental = table_rows(db_copy, table, order_by, count_column)
+        assert incremental != table_rows(db.DB_PATH, table, order_by, count_column), table
+        assert incremental == table_rows(rebuilt, table, order_by, count_column), table
+
+
+def test_delete_missing_removes_rows(csv_dir, db_copy):
+    """--delete-missing 刪除不在 CSV 中的資料列；未指定時保留"""
+    edit_csv(csv_dir, 'security', lambda rows: rows[:-2])
+
+    assert ingest.ingest(csv_dir, db_copy)['security'] == 0
+    assert ingest.ingest(csv_dir, db_copy, delete_missing=True)['security'] == 2
+
+    conn = sqlite3.connect(db_copy)
+    try:
+        count = conn.execute("SELECT COUNT(*) FROM security").fetchone()[0]
+        weights = conn.execute("SELECT SUM(weight_sum) FROM borough_crime_stats").fetchone()[0]
+        expected = conn.execute("SELECT SUM(crime_level_weight) FROM security").fetchone()[0]
+    finally:
+        conn.close()
+    assert count == 97
+    assert weights == expected
@@ -0,0 +1,31 @@
+import shutil
+import sqlite3
+
+import db
+import migrate
+
+
+def schema_version(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return migrate.get_schema_version(conn)
+    finally:
+        conn.close()
+
+
+def test_bundled_database_is_migrated():
+    """專案內的資料庫已套用全部 migration"""
+    assert schema_version(db.DB_PATH) == migrate.MIGRATIONS[-1][0]
+
+
+def test_dashboard_queries_do_not_scan_large_tables():
+    """儀表板的查詢都由索引、彙總表或 R*Tree 取得，不整表掃描大型資料表"""
+    assert migrate.check_query_plans() == []
+
+
+def test_upgrade_is_idempotent(tmp_path):
+    """已是最新版本的資料庫再次升級時不套用任何 migration"""
+    db_path = str(tmp_path / 'copy.sqlite3')
+    shutil.copyfile(db.DB_PATH, db_path)
+    assert migrate.upgrade(db_path) == []
+    assert schema_version(db_path) == migrate.MIGRATIONS[-1][0]
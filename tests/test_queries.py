@@ -0,0 +1,102 @@
+import re
+
+import pandas as pd
+import pytest
+
+import dataset
+import db
+from conftest import VIEWPORTS
+from fig_density import load_viewport_listings, parse_viewport
+from fig_neighborhood import NEIGHBORHOOD_QUERY
+from fig_price import PRICE_QUERY, create_price_figure
+from fig_room import ROOM_QUERY, create_room_figure
+from figure_cache import BOROUGHS, all_selections
+
+# SQLite 追蹤到的 SQL 已代入綁定參數；把字串與 NULL 常數換回佔位符，只比較 SQL 文字本身
+SQL_LITERAL = re.compile(r"'(?:[^']|'')*'|\bNULL\b")
+
+
+def test_price_query_matches_dataset(selection):
+    """SQLite 價格查詢與記憶體資料集的結果相同"""
+    price = db.read_sql_query(PRICE_QUERY, db.borough_params(selection), name='price')
+    expected = dataset.get_dataset().price_summary(list(selection))
+    pd.testing.assert_frame_equal(price.reset_index(drop=True), expected.astype(price.dtypes.to_dict()))
+
+
+def test_room_query_matches_dataset(selection):
+    """SQLite 房型查詢與記憶體資料集的結果相同"""
+    room = db.read_sql_query(ROOM_QUERY, db.borough_params(selection), name='room')
+    expected = dataset.get_dataset().room_listings(list(selection))
+    key = ['listing_id', 'borough', 'price']
+    pd.testing.assert_frame_equal(
+        room.sort_values(key).reset_index(drop=True),
+        expected.sort_values(key).reset_index(drop=True).astype(room.dtypes.to_dict())
+    )
+
+
+def test_borough_names_are_bound_not_executed():
+    """行政區名稱只是綁定參數，不會被當成 SQL 執行"""
+    assert db.read_sql_query(PRICE_QUERY, db.borough_params(["Queens') OR 1=1 --"]), name='price').empty
+
+
+@pytest.mark.parametrize('build', [create_price_figure, create_room_figure])
+def test_one_sql_text_per_query(build, monkeypatch):
+    """圖表以 SQLite 建立時，所有行政區組合執行同一個 SQL 文字（重複使用 prepared statement）"""
+    monkeypatch.setattr(dataset, 'IN_MEMORY_DATASET', False)
+    executed = []
+    conn = db.get_connection()
+    conn.set_trace_callback(executed.append)
+    try:
+        for selection in all_selections():
+            build(list(selection), raise_errors=True)
+    finally:
+        conn.set_trace_callback(None)
+
+    assert len(executed) == len(all_selections())
+    assert len({SQL_LITERAL.sub('?', sql) for sql in executed}) == 1
+    # 行政區名稱只出現在綁定參數（JSON 陣列）中
+    for sql, selection in zip(executed, all_selections()):
+        for borough in selection:
+            assert f'"{borough}"' in sql
+            assert f"'{borough}'" not in sql
+
+
+@pytest.mark.parametrize('relayout_data', VIEWPORTS)
+def test_viewport_query_matches_scan(relayout_data):
+    """R*Tree 查詢的可見範圍房源與直接比較座標的結果相同"""
+    scan_query = """
+    SELECT loc.location_id
+    FROM locations loc
+    JOIN listings l ON l.listing_id = loc.listing_id
+    WHERE loc.longitude BETWEEN ? AND ? AND loc.latitude BETWEEN ? AND ?
+    """
+    viewport = parse_viewport(relayout_data)
+    expected = db.read_sql_query(scan_query, [*viewport['lon'], *viewport['lat']], name='viewport_scan')
+    # R*Tree 的計數以 float32 邊界估算（可能略多），上限放寬到不會截斷的大小
+    listings = load_viewport_listings(viewport, max_points=2 * len(expected) + 100)
+    assert listings is not None
+    assert len(listings) == len(expected)
+
+
+@pytest.mark.parametrize('borough', BOROUGHS)
+def test_neighborhood_rollup_matches_scan(borough):
+    """街區彙總表與直接由 listings / locations 彙總的結果相同"""
+    scan_query = """
+    SELECT
+        IFNULL(loc.borough, '') AS neighborhood,
+        IFNULL(l.room_type, '') AS room_type,
+        COUNT(*) AS listing_count,
+        SUM(l.price) AS price_sum
+    FROM listings l
+    JOIN locations loc ON l.listing_id = loc.listing_id
+    JOIN borough b ON loc.borough_id = b.borough_id
+    WHERE l.price > 0 AND b.borough_name = :borough
+    GROUP BY 1, 2
+    """
+    key = ['neighborhood', 'room_type']
+    rollup = db.read_sql_query(NEIGHBORHOOD_QUERY, {'borough': borough}, name='neighborhood')
+    expected = db.read_sql_query(scan_query, {'borough': borough}, name='neighborhood_scan')
+    pd.testing.assert_frame_equal(
+        rollup.sort_values(key).reset_index(drop=True),
+        expected.sort_values(key).reset_index(drop=True)
+    )
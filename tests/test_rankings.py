@@ -0,0 +1,69 @@
+import shutil
+import sqlite3
+
+import pytest
+
+import db
+import rankings
+import static_figures
+
+
+@pytest.fixture
+def db_copy(tmp_path):
+    """切換到資料庫的暫存副本，結束後還原資料庫路徑、排名與已建立的靜態圖表"""
+    original = db.DB_PATH
+    saved = {name: dict(getattr(static_figures, name)) for name in ('_figures', '_builder_kwargs', '_ranking_versions')}
+    db_path = str(tmp_path / 'copy.sqlite3')
+    shutil.copyfile(original, db_path)
+    db.set_db_path(db_path)
+    rankings.reset_rankings()
+    try:
+        yield db_path
+    finally:
+        db.set_db_path(original)
+        rankings.reset_rankings()
+        for name, values in saved.items():
+            getattr(static_figures, name).clear()
+            getattr(static_figures, name).update(values)
+
+
+def map_customdata(figure):
+    """地圖上每個行政區的 [行政區, 房源數, 觀光收入, 犯罪排名, 投資排名]"""
+    return {row[0]: row for trace in figure['data'] for row in trace.get('customdata') or []}
+
+
+def test_ranks_derived_from_database():
+    """排名由資料庫中的犯罪權重與觀光收入計算
+
+    security 表中 Queens 的犯罪權重（52）高於 Bronx（47），因此 Queens 的犯罪排名為 2、Bronx 為 3
+    （原本寫死的排名表把兩者對調了）。
+    """
+    data = rankings.load_rankings()
+    assert {b: r['crime_score'] for b, r in data.items()} == {
+        'Bronx': 47, 'Brooklyn': 93, 'Manhattan': 30, 'Queens': 52, 'Staten Island': 11
+    }
+    assert {b: r['crime_rank'] for b, r in data.items()} == {
+        'Brooklyn': 1, 'Queens': 2, 'Bronx': 3, 'Manhattan': 4, 'Staten Island': 5
+    }
+    assert {b: r['investment_rank'] for b, r in data.items()} == {
+        'Manhattan': 1, 'Queens': 2, 'Staten Island': 3, 'Bronx': 4, 'Brooklyn': 5
+    }
+
+
+def test_rankings_and_map_follow_database_changes(db_copy):
+    """資料庫檔案變動後，排名與地圖在下一次讀取時以新資料重建，不需重啟"""
+    figure, borough_data = static_figures.get_ranking_figure('map')
+    assert borough_data['Bronx']['investment_rank'] == 4
+    assert map_customdata(figure)['Bronx'][4] == 4
+
+    conn = sqlite3.connect(db_copy)
+    with conn:
+        conn.execute("UPDATE borough SET tourist_revenue = 99999 WHERE borough_name = 'Bronx'")
+    conn.close()
+
+    figure, borough_data = static_figures.get_ranking_figure('map')
+    assert borough_data['Bronx']['tourism_value'] == 99999
+    assert borough_data['Bronx']['investment_rank'] == 1
+    assert map_customdata(figure)['Bronx'][2] == 99999
+    assert map_customdata(figure)['Bronx'][4] == 1
+    assert rankings.get_rankings() == borough_data
@@ -0,0 +1,49 @@
+import shutil
+
+import pandas as pd
+import pytest
+
+import dataset
+import db
+import snapshot
+
+pytest.importorskip('pyarrow')
+
+
+@pytest.fixture(scope='module')
+def datasets(tmp_path_factory):
+    """(查詢 SQLite 的資料集, 由 Arrow 快照載入的資料集, 由 Parquet 快照載入的資料集)"""
+    snapshot_dir = str(tmp_path_factory.mktemp('snapshot'))
+    snapshot.build_snapshot(snapshot_dir=snapshot_dir)
+    return (
+        dataset.ListingDataset(db.read_sql_query(dataset.DATASET_QUERY, name='dataset')),
+        dataset.ListingDataset(snapshot.read_snapshot(snapshot_dir=snapshot_dir)),
+        dataset.ListingDataset(snapshot.read_snapshot(snapshot_dir=snapshot_dir, use_arrow=False)),
+    )
+
+
+def test_snapshot_matches_sqlite(datasets, selection):
+    """由快照載入的資料集與查詢 SQLite 的結果相同"""
+    expected, *loaded = datasets
+    for data in loaded:
+        pd.testing.assert_frame_equal(data.price_summary(list(selection)), expected.price_summary(list(selection)))
+        pd.testing.assert_frame_equal(data.room_listings(list(selection)), expected.room_listings(list(selection)))
+
+
+def test_arrow_snapshot_is_not_copied(datasets):
+    """Arrow 快照的數值欄位直接指向映射的檔案，不複製到 worker 的記憶體"""
+    data = datasets[1]
+    for values in (data.listing_id, data.latitude, data.longitude):
+        assert not values.flags.owndata
+
+
+def test_stale_snapshot_falls_back(tmp_path):
+    """資料庫比快照新時不使用快照"""
+    db_path = tmp_path / 'copy.sqlite3'
+    shutil.copyfile(db.DB_PATH, db_path)
+    snapshot.build_snapshot(str(db_path))
+    assert snapshot.read_snapshot(str(db_path)) is not None
+
+    with open(db_path, 'ab') as f:
+        f.write(b'\0' * 4096)
+    assert snapshot.read_snapshot(str(db_path)) is None